@@ -0,0 +1,74 @@
+"""Measures what disabled debug logging costs an evaluation.
+
+Run from the repository root with
+``PYTHONPATH=. python benchmarks/debug_logging.py``. With debug logging off
+no log.debug call should be made per evaluation, so the time per evaluation
+should not change whether logging calls are real or replaced by no-ops."""
+
+import timeit
+from unittest import mock
+
+from featureflags.evaluations.auth_target import Target
+from featureflags.evaluations.constants import (EQUAL_OPERATOR,
+                                                SEGMENT_MATCH_OPERATOR)
+from featureflags.evaluations.evaluator import Evaluator
+from featureflags.openapi.config.models.clause import Clause
+from featureflags.openapi.config.models.feature_config import (
+    FeatureConfig, FeatureConfigKind)
+from featureflags.openapi.config.models.feature_state import FeatureState
+from featureflags.openapi.config.models.segment import Segment
+from featureflags.openapi.config.models.serve import Serve
+from featureflags.openapi.config.models.serving_rule import ServingRule
+from featureflags.openapi.config.models.variation import Variation
+from featureflags.repository import Repository
+from featureflags.unbounded_cache import UnboundedCache
+from featureflags.util import log
+
+NUMBER = 20000
+
+
+def make_evaluator() -> Evaluator:
+    repository = Repository(UnboundedCache())
+    repository.set_segment(Segment(identifier="beta", name="Beta", rules=[
+        Clause(attribute="email", op=EQUAL_OPERATOR, values=["a@b.c"],
+               negate=False)]))
+    repository.set_flag(FeatureConfig(
+        feature="flag",
+        environment="test",
+        default_serve=Serve(variation="false"),
+        kind=FeatureConfigKind.BOOLEAN,
+        off_variation="false",
+        project="default",
+        state=FeatureState.ON,
+        variations=[Variation(identifier="true", value="true"),
+                    Variation(identifier="false", value="false")],
+        rules=[ServingRule(rule_id="rule", priority=i,
+                           serve=Serve(variation="true"),
+                           clauses=[Clause(attribute="",
+                                           op=SEGMENT_MATCH_OPERATOR,
+                                           values=["beta"], negate=False)])
+               for i in range(5)],
+    ))
+    return Evaluator(repository)
+
+
+def run(evaluator: Evaluator, target: Target) -> float:
+    seconds = timeit.timeit(
+        lambda: evaluator.evaluate("flag", target, "boolean"), number=NUMBER)
+    return seconds / NUMBER * 1e6
+
+
+if __name__ == "__main__":
+    evaluator = make_evaluator()
+    target = Target(identifier="user", attributes={"email": "x@y.z"})
+
+    with mock.patch.object(log, "debug", wraps=log.debug) as debug:
+        evaluator.evaluate("flag", target, "boolean")
+    print(f"log.debug calls per evaluation: {debug.call_count}")
+
+    print(f"logging as is:      {run(evaluator, target):.2f} us/evaluation")
+    with mock.patch.object(log, "debug", lambda *args, **kwargs: None):
+        print(f"log.debug a no-op:  {run(evaluator, target):.2f} "
+              "us/evaluation")
+    evaluator.set_trace_targets(["someone-else"])
+    print(f"tracing another id: {run(evaluator, target):.2f} us/evaluation")
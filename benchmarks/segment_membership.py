@@ -0,0 +1,38 @@
+"""Measures segment membership latency as the included list grows.
+
+Run from the repository root with
+``PYTHONPATH=. python benchmarks/segment_membership.py``. The time per
+evaluation should stay flat from 10 to 100k included targets."""
+
+import timeit
+
+from featureflags.evaluations.auth_target import Target
+from featureflags.evaluations.evaluator import Evaluator
+from featureflags.lru_cache import LRUCache
+from featureflags.openapi.config.models.segment import Segment
+from featureflags.repository import Repository
+
+NUMBER = 10000
+
+
+def run(size: int) -> float:
+    repository = Repository(LRUCache())
+    repository.set_segment(Segment(
+        identifier="beta",
+        name="Beta",
+        included=[Target(identifier=f"user-{i}") for i in range(size)],
+        excluded=[Target(identifier=f"blocked-{i}") for i in range(size)],
+        version=1,
+    ))
+    evaluator = Evaluator(repository)
+    # The last included target is the worst case for a linear scan
+    target = Target(identifier=f"user-{size - 1}")
+    seconds = timeit.timeit(
+        lambda: evaluator._check_target_in_segment(["beta"], target),
+        number=NUMBER)
+    return seconds / NUMBER * 1e6
+
+
+if __name__ == "__main__":
+    for size in (10, 100, 1000, 10000, 100000):
+        print(f"{size:>7} targets: {run(size):.2f} us/check")
@@ -1,8 +1,9 @@
+import asyncio
 import concurrent.futures
 import time
 import traceback
 from threading import Lock, Thread
-from typing import Dict, List, Set, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 import attr
 import httpx
@@ -12,6 +13,7 @@ from .openapi.config import AuthenticatedClient
 from .openapi.config.models.target import Target
 from .openapi.config.models.target_attributes import TargetAttributes
 from .openapi.config.models.variation import Variation
+from .openapi.metrics.api.metrics import post_metrics as _post_metrics
 from .openapi.metrics.api.metrics.post_metrics import \
     sync_detailed as post_metrics
 from .openapi.metrics.models.key_value import KeyValue
@@ -30,7 +32,7 @@ from .sdk_logging_codes import (info_evaluation_metrics_exceeded,
                                 info_metrics_thread_started,
                                 warn_post_metrics_failed,
                                 warn_post_metrics_target_batch_failed)
-from .util import log
+from .util import intern_str, log
 
 FF_METRIC_TYPE = 'FFMETRICS'
 FEATURE_IDENTIFIER_ATTRIBUTE = 'featureIdentifier'
@@ -75,7 +77,7 @@ class AnalyticsService(object):
         self._cluster = cluster
 
         # Evaluation metrics
-        self._data: Dict[str, AnalyticsEvent] = {}
+        self._data: Dict[Tuple[str, str, str, str], AnalyticsEvent] = {}
         # This allows for up to 2K flags with 5 variations each per interval
         self._max_evaluation_metrics = 10000
         self._max_evaluation_metrics_exceeded = False
@@ -96,101 +98,115 @@ class AnalyticsService(object):
         self._seen_targets: Set[str] = set()
 
         self._running = False
+        self._start()
+
+    def _start(self) -> None:
         self._runner = Thread(target=self._sync)
         self._runner.daemon = True
         self._runner.start()
 
     def enqueue(self, target: Target, identifier: str,
                 variation: Variation):
-        event: AnalyticsEvent = AnalyticsEvent(
-            target=target,
-            flag_identifier=identifier,
-            variation=variation
-        )
+        self.enqueue_many(target, [(identifier, variation)])
+
+    def enqueue_many(self, target: Target,
+                     evaluations: List[Tuple[str, Variation]]):
+        """Records several evaluations made for the same target while
+        holding the lock once"""
+        if not evaluations:
+            return
 
         self._lock.acquire()
         try:
-            # Check if adding a new metric would exceed the 10,000 limit
-            if len(self._data) < self._max_evaluation_metrics:
-
-                # Store unique evaluation events. We map a unique evaluation
-                # event to its count.
-                unique_evaluation_key = self.get_key(event)
-                if unique_evaluation_key in self._data:
-                    self._data[unique_evaluation_key].count += 1
-                else:
-                    event.count = 1
-                    self._data[unique_evaluation_key] = event
+            event = None
+            for identifier, variation in evaluations:
+                event = AnalyticsEvent(
+                    target=target,
+                    flag_identifier=intern_str(identifier),
+                    variation=variation
+                )
+                self._add_evaluation(event)
+            self._add_target(event)
+        finally:
+            self._lock.release()
+
+    def _add_evaluation(self, event: AnalyticsEvent) -> None:
+        # Check if adding a new metric would exceed the 10,000 limit
+        if len(self._data) < self._max_evaluation_metrics:
+
+            # Store unique evaluation events. We map a unique evaluation
+            # event to its count.
+            unique_evaluation_key = self.get_key(event)
+            if unique_evaluation_key in self._data:
+                self._data[unique_evaluation_key].count += 1
             else:
-                if not self._max_evaluation_metrics_exceeded:
-                    self._max_evaluation_metrics_exceeded = True
-                    info_evaluation_metrics_exceeded()
-
-            # Don't store this target if it is anonymous. Note, we currently
-            # don't do this check above for evaluation metrics, because we use
-            # the global target.
-            if target.anonymous:
-                return
+                event.count = 1
+                self._data[unique_evaluation_key] = event
+        else:
+            if not self._max_evaluation_metrics_exceeded:
+                self._max_evaluation_metrics_exceeded = True
+                info_evaluation_metrics_exceeded()
+
+    def _add_target(self, event: AnalyticsEvent) -> None:
+        # Don't store this target if it is anonymous. Note, we currently
+        # don't do this check above for evaluation metrics, because we use
+        # the global target.
+        if event.target.anonymous:
+            return
 
-            unique_target_key = self.get_target_key(event)
+        unique_target_key = self.get_target_key(event)
 
-            # If we've seen this target before, don't process it
-            if unique_target_key in self._seen_targets:
-                return
+        # If we've seen this target before, don't process it
+        if unique_target_key in self._seen_targets:
+            return
 
-            self._seen_targets.add(unique_target_key)
-
-            # Check if we're on our final target batch - if we are, and we've
-            # exceeded the max batch size just return early.
-            if len(self._target_data_batches) >= \
-                    self._max_number_of_target_batches:
-                if len(self._target_data_batches[
-                    self._current_target_batch_index]) >= \
-                        self._max_target_batch_size:
-                    if not self.max_target_data_exceeded:
-                        self.max_target_data_exceeded = True
-                        info_metrics_target_exceeded()
-                    return
+        self._seen_targets.add(unique_target_key)
+
+        # Check if we're on our final target batch - if we are, and we've
+        # exceeded the max batch size just return early.
+        if len(self._target_data_batches) >= \
+                self._max_number_of_target_batches:
+            if len(self._target_data_batches[
+                self._current_target_batch_index]) >= \
+                    self._max_target_batch_size:
+                if not self.max_target_data_exceeded:
+                    self.max_target_data_exceeded = True
+                    info_metrics_target_exceeded()
+                return
 
-            if event.target is not None and not event.target.anonymous:
-
-                # Store unique targets. If the target already exists
-                # in any of the batches, don't continue processing it
-                for batch in self._target_data_batches:
-                    if unique_target_key in batch:
-                        return
-
-                # If we've exceeded the max batch size for the current
-                # batch, then create a new batch and start using it.
-                if len(self._target_data_batches[
-                    self._current_target_batch_index]) >= \
-                        self._max_target_batch_size:
-                    self._target_data_batches.append({})
-                    self._current_target_batch_index += 1
-
-                target_name = event.target.name
-                # If the target has no name use the identifier
-                if not target_name:
-                    target_name = event.target.identifier
-                self._target_data_batches[
-                    self._current_target_batch_index][unique_target_key] = \
-                    MetricTargetData(
-                        identifier=event.target.identifier,
-                        name=target_name,
-                        attributes=event.target.attributes
-                )
+        if event.target is not None and not event.target.anonymous:
 
-        finally:
-            self._lock.release()
+            # Store unique targets. If the target already exists
+            # in any of the batches, don't continue processing it
+            for batch in self._target_data_batches:
+                if unique_target_key in batch:
+                    return
 
-    # Returns a key for unique evaluations events.
-    def get_key(self, event: AnalyticsEvent) -> str:
-        return '{feature}-{variation}-{value}-{target}'.format(
-            feature=event.flag_identifier,
-            variation=event.variation.identifier,
-            value=event.variation.value,
-            target=GLOBAL_TARGET,
-        )
+            # If we've exceeded the max batch size for the current
+            # batch, then create a new batch and start using it.
+            if len(self._target_data_batches[
+                self._current_target_batch_index]) >= \
+                    self._max_target_batch_size:
+                self._target_data_batches.append({})
+                self._current_target_batch_index += 1
+
+            target_name = event.target.name
+            # If the target has no name use the identifier
+            if not target_name:
+                target_name = event.target.identifier
+            self._target_data_batches[
+                self._current_target_batch_index][unique_target_key] = \
+                MetricTargetData(
+                    identifier=event.target.identifier,
+                    name=target_name,
+                    attributes=event.target.attributes
+            )
+
+    # Returns a key for unique evaluations events. The identifiers are
+    # interned when flags are compiled, so keys compare by identity.
+    def get_key(self, event: AnalyticsEvent) -> Tuple[str, str, str, str]:
+        return (event.flag_identifier, event.variation.identifier,
+                event.variation.value, GLOBAL_TARGET)
 
     # Returns a key for unique targets. Targets are considered unique
     # if they have different identifiers.
@@ -207,9 +223,63 @@ class AnalyticsService(object):
                 self._send_data()
 
     def _send_data(self) -> None:
+        data = self._take_data()
+        if data is None:
+            return
+        body, target_data_batches = data
+        try:
+            response = post_metrics(client=self._client,
+                                    environment_uuid=self._environment,
+                                    body=body,
+                                    cluster=self._cluster)
+
+            log.debug('Metrics server returns: %d', response.status_code)
+            if response.status_code >= 400:
+                warn_post_metrics_failed(response.status_code)
+                return
+            if len(target_data_batches) > 0:
+                log.info('Sending %s target batches to metrics',
+                         len(target_data_batches))
+                unique_responses_codes = {}
+
+                # Process batches concurrently
+                with concurrent.futures.ThreadPoolExecutor() as executor:
+                    futures = []
+                    for batch in target_data_batches:
+                        # Staggering requests over 0.02 seconds mean that we
+                        # will send 200 requests every four seconds, so that
+                        # the backend isn't hit too hard.
+                        time.sleep(0.02)
+                        future = executor.submit(
+                            self.process_target_data_batch,
+                            batch)
+                        futures.append(future)
+
+                    # Wait for all batches to complete
+                    concurrent.futures.wait(futures)
+
+                    # Get unique status codes
+                    for future in futures:
+                        status_code = future.result()
+                        if status_code in unique_responses_codes:
+                            unique_responses_codes[status_code] += 1
+                        else:
+                            unique_responses_codes[status_code] = 1
+
+                _log_target_batch_results(unique_responses_codes)
+
+            info_metrics_success()
+        except httpx.RequestError as ex:
+            print(traceback.format_exc())
+            warn_post_metrics_failed(ex)
+
+    def _take_data(self) -> \
+            Optional[Tuple[Metrics, List[List[TargetData]]]]:
+        """Returns the metrics request body and the batches of targets that
+        did not fit in it, clearing them, or None when there is no data"""
         if not bool(self._data):
             log.debug('No metrics data!')
-            return
+            return None
         log.debug('Start sending metrics data')
         self._lock.acquire()
         target_data: List[TargetData] = []
@@ -262,58 +332,7 @@ class AnalyticsService(object):
 
         body: Metrics = Metrics(target_data=target_data,
                                 metrics_data=metrics_data)
-        try:
-            response = post_metrics(client=self._client,
-                                    environment_uuid=self._environment,
-                                    body=body,
-                                    cluster=self._cluster)
-
-            log.debug('Metrics server returns: %d', response.status_code)
-            if response.status_code >= 400:
-                warn_post_metrics_failed(response.status_code)
-                return
-            if len(target_data_batches) > 0:
-                log.info('Sending %s target batches to metrics',
-                         len(target_data_batches))
-                unique_responses_codes = {}
-
-                # Process batches concurrently
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    futures = []
-                    for batch in target_data_batches:
-                        # Staggering requests over 0.02 seconds mean that we
-                        # will send 200 requests every four seconds, so that
-                        # the backend isn't hit too hard.
-                        time.sleep(0.02)
-                        future = executor.submit(
-                            self.process_target_data_batch,
-                            batch)
-                        futures.append(future)
-
-                    # Wait for all batches to complete
-                    concurrent.futures.wait(futures)
-
-                    # Get unique status codes
-                    for future in futures:
-                        status_code = future.result()
-                        if status_code in unique_responses_codes:
-                            unique_responses_codes[status_code] += 1
-                        else:
-                            unique_responses_codes[status_code] = 1
-
-                # Log any error codes
-                for unique_code, count in unique_responses_codes.items():
-                    if unique_code >= 400:
-                        warn_post_metrics_target_batch_failed(
-                            f'{count} batches received code {unique_code}')
-                        continue
-                    info_metrics_target_batch_success(
-                        f'{count} batches successful')
-
-            info_metrics_success()
-        except httpx.RequestError as ex:
-            print(traceback.format_exc())
-            warn_post_metrics_failed(ex)
+        return body, target_data_batches
 
     def process_target_data_batch(self, target_data_batch):
         batch_request_body: Metrics = Metrics(
@@ -357,3 +376,90 @@ class AnalyticsService(object):
 
     def __exit__(self, type, value, traceback):
         self.close()
+
+
+class AsyncAnalyticsService(AnalyticsService):
+    """AnalyticsService posting metrics from a task on the running event
+    loop instead of a thread. Must be created inside the loop and closed
+    with aclose."""
+
+    def _start(self) -> None:
+        self._runner_task = asyncio.get_running_loop().create_task(
+            self._async_sync())
+
+    @property
+    def client(self) -> AuthenticatedClient:
+        return self._client
+
+    async def _async_sync(self) -> None:
+        info_metrics_thread_started(f'{self._config.events_sync_interval}s')
+        self._running = True
+        while self._running:
+            await asyncio.sleep(self._config.events_sync_interval)
+            await self._async_send_data()
+
+    async def _async_send_data(self) -> None:
+        data = self._take_data()
+        if data is None:
+            return
+        body, target_data_batches = data
+        try:
+            response = await _post_metrics.asyncio_detailed(
+                client=self._client, environment_uuid=self._environment,
+                body=body, cluster=self._cluster)
+
+            log.debug('Metrics server returns: %d', response.status_code)
+            if response.status_code >= 400:
+                warn_post_metrics_failed(response.status_code)
+                return
+            if len(target_data_batches) > 0:
+                log.info('Sending %s target batches to metrics',
+                         len(target_data_batches))
+                requests = []
+                for batch in target_data_batches:
+                    requests.append(asyncio.ensure_future(
+                        self._async_post_target_data_batch(batch)))
+                    # Stagger the requests like the threaded service does
+                    await asyncio.sleep(0.02)
+                unique_responses_codes: Dict[int, int] = {}
+                for status_code in await asyncio.gather(*requests):
+                    unique_responses_codes[status_code] = \
+                        unique_responses_codes.get(status_code, 0) + 1
+                _log_target_batch_results(unique_responses_codes)
+
+            info_metrics_success()
+        except httpx.RequestError as ex:
+            warn_post_metrics_failed(ex)
+
+    async def _async_post_target_data_batch(
+            self, target_data_batch: List[TargetData]) -> int:
+        response = await _post_metrics.asyncio_detailed(
+            client=self._client, environment_uuid=self._environment,
+            body=Metrics(target_data=target_data_batch, metrics_data=[]),
+            cluster=self._cluster)
+        return response.status_code
+
+    def close(self) -> None:
+        raise TypeError("AsyncAnalyticsService must be closed with aclose")
+
+    async def aclose(self) -> None:
+        """Stops the sync task and sends the remaining metrics"""
+        self._running = False
+        self._runner_task.cancel()
+        try:
+            await self._runner_task
+        except asyncio.CancelledError:
+            pass
+        if len(self._data) > 0:
+            await self._async_send_data()
+        info_metrics_thread_existed()
+
+
+def _log_target_batch_results(unique_responses_codes: Dict[int, int]) -> None:
+    # Log any error codes
+    for unique_code, count in unique_responses_codes.items():
+        if unique_code >= 400:
+            warn_post_metrics_target_batch_failed(
+                f'{count} batches received code {unique_code}')
+            continue
+        info_metrics_target_batch_success(f'{count} batches successful')
@@ -3,6 +3,11 @@ from tenacity import retry_if_result, wait_exponential, \
 from http import HTTPStatus
 from typing import Any, Union, List
 
+from .openapi.config.api.client import (authenticate as _authenticate,
+                                        get_all_segments,
+                                        get_feature_config,
+                                        get_feature_config_by_identifier,
+                                        get_segment_by_identifier)
 from .openapi.config.api.client.authenticate import \
     sync_detailed as authenticate
 from .openapi.config.api.client.get_all_segments import \
@@ -168,3 +173,72 @@ def retryable_retrieve_segment_by_identifier(environment_uuid: str,
                                           environment_uuid=environment_uuid,
                                           cluster=cluster,
                                           rules=TARGET_SEGMENT_RULES_PARAM)
+
+
+# Coroutine versions of the requests above for AsyncCfClient, retried the
+# same way without blocking the event loop
+
+
+@default_retry_strategy(
+    before_sleep_func=make_log_warning_before_sleep(warn_auth_retying),
+    on_retry_error=handle_retries_exceeded)
+async def async_retryable_authenticate(
+        client: Union[AuthenticatedClient, Client],
+        body: AuthenticationRequest) -> \
+        Response[Union[AuthenticationResponse, Any]]:
+    return await _authenticate.asyncio_detailed(client=client, body=body)
+
+
+@default_retry_strategy(
+    before_sleep_func=make_log_warning_before_sleep(
+        warning_fetch_all_segments_retrying),
+    on_retry_error=handle_retries_exceeded)
+async def async_retryable_retrieve_segments(
+        environment_uuid: str,
+        client: AuthenticatedClient,
+        cluster: Union[Unset, str] = UNSET) -> Response[List[Segment]]:
+    return await get_all_segments.asyncio_detailed(
+        client=client, environment_uuid=environment_uuid, cluster=cluster,
+        rules=TARGET_SEGMENT_RULES_PARAM)
+
+
+@default_retry_strategy(
+    before_sleep_func=make_log_warning_before_sleep(
+        warning_fetch_all_features_retrying),
+    on_retry_error=handle_retries_exceeded)
+async def async_retryable_retrieve_feature_config(
+        environment_uuid: str,
+        client: AuthenticatedClient,
+        cluster: Union[Unset, str] = UNSET) -> \
+        Response[List[FeatureConfig]]:
+    return await get_feature_config.asyncio_detailed(
+        client=client, environment_uuid=environment_uuid, cluster=cluster)
+
+
+@default_retry_strategy(
+    before_sleep_func=make_log_warning_before_sleep(
+        warning_fetch_feature_by_id_retrying),
+    on_retry_error=handle_retries_exceeded)
+async def async_retryable_retrieve_feature_config_by_identifier(
+        environment_uuid: str,
+        identifier: str,
+        client: AuthenticatedClient,
+        cluster: Union[Unset, str] = UNSET) -> Response[FeatureConfig]:
+    return await get_feature_config_by_identifier.asyncio_detailed(
+        client=client, identifier=identifier,
+        environment_uuid=environment_uuid, cluster=cluster)
+
+
+@default_retry_strategy(
+    before_sleep_func=make_log_warning_before_sleep(
+        warning_fetch_group_by_id_retrying),
+    on_retry_error=handle_retries_exceeded)
+async def async_retryable_retrieve_segment_by_identifier(
+        environment_uuid: str,
+        identifier: str,
+        client: AuthenticatedClient,
+        cluster: Union[Unset, str] = UNSET) -> Response[Segment]:
+    return await get_segment_by_identifier.asyncio_detailed(
+        client=client, identifier=identifier,
+        environment_uuid=environment_uuid, cluster=cluster,
+        rules=TARGET_SEGMENT_RULES_PARAM)
@@ -0,0 +1,172 @@
+"""CfClient for asyncio applications.
+
+Authentication, polling, streaming and metrics run as tasks on the event
+loop the client is created in, instead of on threads. Evaluations are the
+same synchronous, non-blocking calls as on CfClient."""
+
+import asyncio
+from typing import Any, Callable, List, Optional
+
+import featureflags.sdk_logging_codes as sdk_codes
+
+from .analytics import AsyncAnalyticsService
+from .api import UnrecoverableRequestException, async_retryable_authenticate
+from .client import CfClient, MissingOrEmptyAPIKeyException
+from .config import Config
+from .openapi.config.api.client.authenticate import AuthenticationRequest
+from .polling import AsyncPollingProcessor
+from .streaming import AsyncStreamProcessor
+from .util import log
+
+
+class AsyncCfClient(CfClient):
+    """Feature flag client running on the asyncio event loop.
+
+    Must be created inside a running event loop, for example in the
+    lifespan handler of an ASGI application, and closed with `await
+    client.close()` or by using it as an async context manager::
+
+        async with AsyncCfClient(api_key) as client:
+            await client.wait_for_initialization()
+            client.bool_variation("flag", target, False)
+    """
+
+    def __init__(
+            self, sdk_key: str,
+            *options: Callable,
+            config: Optional[Config] = None
+    ):
+        self._tasks: List[asyncio.Task] = []
+        self._polling_processor: Optional[AsyncPollingProcessor] = None
+        self._stream: Optional[AsyncStreamProcessor] = None
+        super().__init__(sdk_key, *options, config=config)
+
+    def run(self):
+        # Raises RuntimeError outside of a running event loop
+        loop = asyncio.get_running_loop()
+        self._initialized = asyncio.Event()
+        self._tasks.append(loop.create_task(self._run()))
+
+    async def _run(self) -> None:
+        try:
+            if self._sdk_key is None:
+                raise MissingOrEmptyAPIKeyException("SDK Key is None")
+
+            if self._sdk_key == "":
+                raise MissingOrEmptyAPIKeyException("SDK Key is an empty "
+                                                    "string")
+
+            await self.authenticate()
+            sdk_codes.info_sdk_auth_ok()
+            streaming_event = asyncio.Event()
+            polling_event = asyncio.Event()
+
+            self._polling_processor = AsyncPollingProcessor(
+                client=self._client,
+                config=self._config,
+                environment_id=self._environment_id,
+                wait_for_initialization=self._initialized,
+                initialised_failed_reason=self._initialised_failed_reason,
+                ready=polling_event,
+                stream_ready=streaming_event,
+                repository=self._repository,
+                cluster=self._cluster,
+            )
+            self._start(self._polling_processor.run())
+
+            if self._config.enable_stream:
+                self._stream = AsyncStreamProcessor(
+                    repository=self._repository,
+                    client=self._client,
+                    environment_id=self._environment_id,
+                    api_key=self._sdk_key,
+                    config=self._config,
+                    ready=streaming_event,
+                    poller=polling_event,
+                    cluster=self._cluster,
+                )
+                self._start(self._stream.run())
+
+            if self._config.enable_analytics:
+                metrics_client = self.make_client(
+                    self._config.events_url,
+                    self._auth_token,
+                    self._account_id,
+                    config=self._config)
+                self._analytics = AsyncAnalyticsService(
+                    config=self._config,
+                    client=metrics_client,
+                    environment=self._environment_id,
+                    cluster=self._cluster,
+                )
+
+        except UnrecoverableRequestException as e:
+            sdk_codes.warn_auth_failed_exceed_retries()
+            sdk_codes.warn_failed_init_auth_error(e)
+            self._initialized_failed = True
+            self._initialized.set()
+        except MissingOrEmptyAPIKeyException:
+            self._initialized_failed = True
+            self._initialised_failed_reason[True] \
+                = str(MissingOrEmptyAPIKeyException)
+            sdk_codes.wan_missing_sdk_key()
+            self._initialized.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            sdk_codes.warn_failed_init_auth_error(ex)
+            self._initialized_failed = True
+            self._initialised_failed_reason[True] = str(ex)
+            self._initialized.set()
+
+    def _start(self, coroutine: Any) -> None:
+        self._tasks.append(asyncio.ensure_future(coroutine))
+
+    async def authenticate(self):
+        body = AuthenticationRequest(api_key=self._sdk_key)
+        auth_client = self._make_auth_client()
+        try:
+            response = (await async_retryable_authenticate(
+                client=auth_client, body=body)).parsed
+        finally:
+            await auth_client.get_async_httpx_client().aclose()
+        self._set_auth_token(response.auth_token)
+
+    async def wait_for_initialization(self, timeout: Optional[float] = None):
+        """Waits until the flags and segments are loaded, or initialization
+        failed. Raises asyncio.TimeoutError if `timeout` seconds pass."""
+        sdk_codes.info_sdk_init_waiting()
+        await asyncio.wait_for(self._initialized.wait(), timeout)
+
+    async def close(self):
+        """Stops the polling, streaming and metrics tasks, sends the
+        remaining metrics and closes the HTTP connections"""
+        sdk_codes.info_sdk_start_close()
+        if self._polling_processor is not None:
+            self._polling_processor.stop()
+        if self._stream is not None:
+            self._stream.stop()
+        for task in self._tasks:
+            task.cancel()
+        for result in await asyncio.gather(*self._tasks,
+                                           return_exceptions=True):
+            if isinstance(result, Exception) and \
+                    not isinstance(result, asyncio.CancelledError):
+                log.warning("Client task failed: %s", result)
+        self._tasks = []
+
+        if self._analytics is not None:
+            await self._analytics.aclose()
+            await self._analytics.client.get_async_httpx_client().aclose()
+        if self._client is not None:
+            await self._client.get_async_httpx_client().aclose()
+        sdk_codes.info_sdk_close_success()
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with AsyncCfClient")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.close()
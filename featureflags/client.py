@@ -1,23 +1,36 @@
 """Client for interacting with Harness FF server"""
 
-import json
+import logging
 import threading
 from enum import Enum
-from typing import Any, Callable, Dict, Optional, Union
+from typing import (Any, Callable, Dict, Iterable, List, Optional, Tuple,
+                    Union)
 
 from jwt import decode
 
 import featureflags.sdk_logging_codes as sdk_codes
 from featureflags.analytics import AnalyticsService
+from featureflags.evaluations.attribute_stats import (MissingAttributes,
+                                                      MissingAttributeStats)
+from featureflags.evaluations import json_values
+from featureflags.evaluations.compiled import (UNPARSABLE,
+                                               CompiledVariation,
+                                               parse_value)
 from featureflags.evaluations.evaluator import (Evaluator,
                                                 FlagKindMismatchException)
+from featureflags.evaluations.result_cache import ResultCache
+from featureflags.evaluations.trace import log_trace
 from featureflags.repository import Repository
+from featureflags.snapshot_repository import (RepositorySnapshot,
+                                              SnapshotRepository)
 
 from .api import UnrecoverableRequestException, retryable_authenticate
 from .config import Config, default_config
 from .evaluations.auth_target import Target
 from .openapi.config.api.client.authenticate import AuthenticationRequest
 from .openapi.config.client import AuthenticatedClient, Client
+from .openapi.config.models.feature_config_kind import FeatureConfigKind
+from .openapi.config.models.variation import Variation
 from .polling import PollingProcessor
 from .streaming import StreamProcessor
 from .util import log
@@ -62,6 +75,8 @@ class CfClient(object):
         self._config: Config = default_config
         self._cluster: str = '1'
         self._account_id = None
+        # Created once authenticated, if analytics are enabled
+        self._analytics: Optional[AnalyticsService] = None
 
         if config:
             self._config = config
@@ -73,8 +88,21 @@ class CfClient(object):
         if self._config.cache is None:
             raise Exception("cache cannot be none")
 
-        self._repository = Repository(self._config.cache)
-        self._evaluator = Evaluator(self._repository)
+        if self._config.snapshot_repository:
+            self._repository = SnapshotRepository()
+        else:
+            self._repository = Repository(self._config.cache)
+        result_cache = None
+        if self._config.evaluation_cache_size > 0:
+            result_cache = ResultCache(
+                size=self._config.evaluation_cache_size,
+                ttl=self._config.evaluation_cache_ttl)
+        self._evaluator = Evaluator(
+            self._repository, result_cache,
+            trace_targets=self._config.trace_targets,
+            trace_handler=self._config.trace_handler or log_trace,
+            missing_attributes=MissingAttributes(
+                self._config.missing_attributes_interval))
 
         self.run()
 
@@ -171,16 +199,24 @@ class CfClient(object):
         return self._environment_id
 
     def authenticate(self):
+        body = AuthenticationRequest(api_key=self._sdk_key)
+        response = retryable_authenticate(client=self._make_auth_client(),
+                                          body=body).parsed
+        self._set_auth_token(response.auth_token)
+
+    def _make_auth_client(self) -> Client:
         verify = True
         if self._config.tls_trusted_cas_file is not None:
             verify = self._config.tls_trusted_cas_file
 
-        client = Client(base_url=self._config.base_url, verify_ssl=verify,
-                        raise_on_unexpected_status=True,
-                        httpx_args=self._config.httpx_args)
-        body = AuthenticationRequest(api_key=self._sdk_key)
-        response = retryable_authenticate(client=client, body=body).parsed
-        self._auth_token = response.auth_token
+        return Client(base_url=self._config.base_url, verify_ssl=verify,
+                      raise_on_unexpected_status=True,
+                      httpx_args=self._config.httpx_args)
+
+    def _set_auth_token(self, auth_token: str) -> None:
+        """Reads the environment and cluster from the token and creates the
+        client for the config API"""
+        self._auth_token = auth_token
 
         decoded = decode(self._auth_token, options={
             "verify_signature": False})
@@ -237,341 +273,210 @@ class CfClient(object):
 
     def bool_variation(self, identifier: str, target: Target,
                        default: bool) -> bool:
-        log.debug("bool_variation: evaluating flag='%s', target='%s', "
-                  "default=%s", identifier, target.identifier, default)
-
-        # If initialization has failed, then return the default variation
-        # immediately
-        if self._initialised_failed_reason[True] is not None:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate bool variation for flag '%s'"
-                " and the default variation '%s' is being returned. Reason: "
-                "`Client is not initialized: %s'",
-                identifier, default, self._initialised_failed_reason[True])
-            log.debug("bool_variation: returning %s (client not initialized)",
-                      default)
-            return default
-
-        try:
-            variation = self._evaluator.evaluate(identifier, target, "boolean")
-
-            if not variation or not variation.value:
-                log.error(
-                    "SDKCODE:6001: Failed to evaluate bool variation for %s "
-                    "and the "
-                    "default variation '%s' is being returned",
-                    {"target": target, "flag": identifier}, default)
-                log.debug("bool_variation: returning %s (no variation found)",
-                          default)
-                return default
-
-            # Only register metrics if analytics is enabled,
-            # and sometimes when the SDK starts up we can
-            # evaluate before the flag is cached which results in
-            # an empty identifier.
-            if self._config.enable_analytics and variation.identifier != "":
-                self._analytics.enqueue(target, identifier, variation)
-
-            result = variation.value.lower() == "true"
-            log.debug("bool_variation: returning %s (variation='%s', "
-                      "value='%s')", result, variation.identifier,
-                      variation.value)
-            return result
-
-        except FlagKindMismatchException as ex:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate bool variation for flag '%s'"
-                " and the default variation '%s' is being returned. Reason: "
-                "'%s'", identifier, default, str(ex))
-            log.debug("bool_variation: returning %s (flag kind mismatch)",
-                      default)
-            return default
+        return self._variation("bool", FeatureConfigKind.BOOLEAN, identifier,
+                               target, default, _parsed_value)
 
     def int_variation(self, identifier: str, target: Target,
                       default: int) -> int:
-        log.debug("int_variation: evaluating flag='%s', target='%s', "
-                  "default=%s", identifier, target.identifier, default)
-
-        # If initialization has failed, then return the default variation
-        # immediately
-        if self._initialised_failed_reason[True] is not None:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate int variation for flag '%s'"
-                " and the default variation '%s' is being returned. Reason: "
-                "`Client is not initialized: %s'",
-                identifier, default, self._initialised_failed_reason[True])
-            log.debug("int_variation: returning %s (client not initialized)",
-                      default)
-            return default
-
-        try:
-            variation = self._evaluator.evaluate(identifier, target, "int")
-
-            if not variation or not variation.value:
-                log.error(
-                    "SDKCODE:6001: Failed to evaluate int variation for %s "
-                    "and the "
-                    "default variation '%s' is being returned",
-                    {"target": target, "flag": identifier}, default)
-                log.debug("int_variation: returning %s (no variation found)",
-                          default)
-                return default
-
-            # Only register metrics if analytics is enabled,
-            # and sometimes when the SDK starts up we can
-            # evaluate before the flag is cached which results in
-            # an empty identifier.
-            if self._config.enable_analytics and variation.identifier != "":
-                self._analytics.enqueue(target, identifier, variation)
-
-            result = int(variation.value)
-            log.debug("int_variation: returning %s (variation='%s', "
-                      "value='%s')", result, variation.identifier,
-                      variation.value)
-            return result
-
-        except FlagKindMismatchException as ex:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate int variation for flag '%s'"
-                " and the default variation '%s' is being returned. Reason: "
-                "'%s'", identifier, default, str(ex))
-            log.debug("int_variation: returning %s (flag kind mismatch)",
-                      default)
-            return default
+        return self._variation("int", FeatureConfigKind.INT, identifier,
+                               target, default, _int_value)
 
     def number_variation(self, identifier: str, target: Target,
                          default: float) -> float:
-        log.debug("number_variation: evaluating flag='%s', target='%s', "
-                  "default=%s", identifier, target.identifier, default)
-
-        # If initialization has failed, then return the default variation
-        # immediately
-        if self._initialised_failed_reason[True] is not None:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate number variation for flag "
-                "'%s' and the default variation '%s' is being returned. "
-                "Reason: `Client is not initialized: %s'",
-                identifier, default, self._initialised_failed_reason[True])
-            log.debug("number_variation: returning %s (client not init)",
-                      default)
-            return default
-
-        try:
-            variation = self._evaluator.evaluate(
-                identifier, target, "int")
-
-            if not variation or not variation.value:
-                log.error(
-                    "SDKCODE:6001: Failed to evaluate number variation for %s "
-                    "and the "
-                    "default variation '%s' is being returned",
-                    {"target": target, "flag": identifier}, default)
-                log.debug("number_variation: returning %s (no variation)",
-                          default)
-                return default
-
-            # Only register metrics if analytics is enabled,
-            # and sometimes when the SDK starts up we can
-            # evaluate before the flag is cached which results in
-            # an empty identifier.
-            if self._config.enable_analytics and variation.identifier != "":
-                self._analytics.enqueue(target, identifier, variation)
-
-            result = float(variation.value)
-            log.debug("number_variation: returning %s (variation='%s', "
-                      "value='%s')", result, variation.identifier,
-                      variation.value)
-            return result
-
-        except FlagKindMismatchException as ex:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate number variation for flag "
-                "'%s'  and the default variation '%s' is being returned. "
-                "Reason: '%s'", identifier, default, str(ex))
-            log.debug("number_variation: returning %s (flag kind mismatch)",
-                      default)
-            return default
+        return self._variation("number", FeatureConfigKind.INT, identifier,
+                               target, default, _number_value)
 
     def int_or_float_variation(self, identifier: str, target: Target,
                                default: Union[float, int]) -> \
             Union[float, int]:
-        log.debug("int_or_float_variation: evaluating flag='%s', target='%s', "
-                  "default=%s", identifier, target.identifier, default)
-
-        # If initialization has failed, then return the default variation
-        # immediately
-        if self._initialised_failed_reason[True] is not None:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate int_or_float variation for "
-                "flag '%s' and the default variation '%s' is being returned. "
-                "Reason: `Client is not initialized: %s'",
-                identifier, default, self._initialised_failed_reason[True])
-            log.debug("int_or_float_variation: returning %s (client not "
-                      "initialized)", default)
-            return default
-
-        try:
-            variation = self._evaluator.evaluate(
-                identifier, target, "int")
-
-            if not variation or not variation.value:
-                log.error(
-                    "SDKCODE:6001: Failed to evaluate int_or_float variation "
-                    "for %s and the "
-                    "default variation '%s' is being returned",
-                    {"target": target, "flag": identifier}, default)
-                log.debug("int_or_float_variation: returning %s (no variation "
-                          "found)", default)
-                return default
-
-            # Only register metrics if analytics is enabled,
-            # and sometimes when the SDK starts up we can
-            # evaluate before the flag is cached which results in
-            # an empty identifier.
-            if self._config.enable_analytics and variation.identifier != "":
-                self._analytics.enqueue(target, identifier, variation)
-
-            try:
-                result = int(variation.value)
-            except ValueError:
-                try:
-                    result = float(variation.value)
-                except ValueError:
-                    # If both conversions fail, log an error and return the
-                    # default
-                    log.error(
-                        "SDKCODE:6001: Invalid number format for %s. "
-                        "Expected a number but got '%s'",
-                        {"flag": identifier, "value": variation.value}
-                    )
-                    log.debug("int_or_float_variation: returning %s (invalid "
-                              "number format)", default)
-                    return default
-
-            log.debug("int_or_float_variation: returning %s (variation='%s', "
-                      "value='%s')", result, variation.identifier,
-                      variation.value)
-            return result
-
-        except FlagKindMismatchException as ex:
-            log.error(
-                "SDKCODE:6001: Failed to evaluate int_or_float variation for "
-                "flag '%s'  and the default variation '%s' is being returned. "
-                "Reason: '%s'", identifier, default, str(ex))
-            log.debug("int_or_float_variation: returning %s (flag kind "
-                      "mismatch)", default)
-            return default
+        return self._variation("int_or_float", FeatureConfigKind.INT,
+                               identifier, target, default,
+                               _parsed_value)
 
     def string_variation(self, identifier: str, target: Target,
                          default: str) -> str:
-        log.debug("string_variation: evaluating flag='%s', target='%s', "
-                  "default='%s'", identifier, target.identifier, default)
+        return self._variation("string", FeatureConfigKind.STRING,
+                               identifier, target, default, _string_value)
+
+    def json_variation(self, identifier: str, target: Target,
+                       default: Dict[str, Any],
+                       shared: bool = False) -> Dict[str, Any]:
+        """Returns a copy-on-write view of the JSON value, which copies only
+        the parts that are read. With `shared` the value parsed when the
+        flag was stored is returned as is, it cannot be modified."""
+        return self._variation("json", FeatureConfigKind.JSON, identifier,
+                               target, default,
+                               _parsed_value if shared else _json_value)
+
+    def _variation(self, name: str, kind: FeatureConfigKind,
+                   identifier: str, target: Target, default: Any,
+                   value_of: Callable[[Variation, Any], Any]) -> Any:
+        """Evaluates the flag and returns the value of the variation, parsed
+        when the flag was stored (see CompiledVariation) and converted by
+        `value_of`, or `default` when the flag cannot be evaluated"""
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("%s_variation: evaluating flag='%s', target='%s', "
+                      "default=%s", name, identifier, target.identifier,
+                      default)
 
         # If initialization has failed, then return the default variation
         # immediately
         if self._initialised_failed_reason[True] is not None:
             log.error(
-                "SDKCODE:6001: Failed to evaluate string variation for flag "
-                "'%s' and the default variation '%s' is being returned. "
-                "Reason: `Client is not initialized: %s'",
-                identifier, default, self._initialised_failed_reason[True])
-            log.debug("string_variation: returning '%s' (client not "
-                      "initialized)", default)
+                "SDKCODE:6001: Failed to evaluate %s variation for flag '%s'"
+                " and the default variation '%s' is being returned. Reason: "
+                "`Client is not initialized: %s'",
+                name, identifier, default,
+                self._initialised_failed_reason[True])
+            if debug:
+                log.debug("%s_variation: returning %s (client not "
+                          "initialized)", name, default)
             return default
 
         try:
-            variation = self._evaluator.evaluate(
-                identifier, target, "string")
-
-            if not variation or not variation.value:
-                log.error(
-                    "SDKCODE:6001: Failed to evaluate string variation for %s "
-                    "and the "
-                    "default variation '%s' is being returned",
-                    {"target": target, "flag": identifier}, default)
-                log.debug("string_variation: returning '%s' (no variation "
-                          "found)", default)
-                return default
-
-            # Only register metrics if analytics is enabled,
-            # and sometimes when the SDK starts up we can
-            # evaluate before the flag is cached which results in
-            # an empty identifier.
-            if self._config.enable_analytics and variation.identifier != "":
-                self._analytics.enqueue(target, identifier, variation)
-
-            log.debug("string_variation: returning '%s' (variation='%s', "
-                      "value='%s')", variation.value, variation.identifier,
-                      variation.value)
-            return variation.value
-
+            variation = self._evaluator.evaluate(identifier, target, kind)
         except FlagKindMismatchException as ex:
             log.error(
-                "SDKCODE:6001: Failed to evaluate string variation for flag "
-                "'%s' and the default variation '%s' is being returned. "
-                "Reason: '%s'", identifier, default, str(ex))
-            log.debug("string_variation: returning '%s' (flag kind mismatch)",
-                      default)
+                "SDKCODE:6001: Failed to evaluate %s variation for flag '%s'"
+                " and the default variation '%s' is being returned. Reason: "
+                "'%s'", name, identifier, default, str(ex))
+            if debug:
+                log.debug("%s_variation: returning %s (flag kind mismatch)",
+                          name, default)
             return default
 
-    def json_variation(self, identifier: str, target: Target,
-                       default: Dict[str, Any]) -> Dict[str, Any]:
-        log.debug("json_variation: evaluating flag='%s', target='%s', "
-                  "default=%s", identifier, target.identifier, default)
-
-        # If initialization has failed, then return the default variation
-        # immediately
-        if self._initialised_failed_reason[True] is not None:
+        if not variation or not variation.value:
             log.error(
-                "SDKCODE:6001: Failed to evaluate json variation for flag '%s'"
-                " and the default variation '%s' is being returned. Reason: "
-                "`Client is not initialized: %s'",
-                identifier, default, self._initialised_failed_reason[True])
-            log.debug("json_variation: returning %s (client not initialized)",
-                      default)
+                "SDKCODE:6001: Failed to evaluate %s variation for %s and the "
+                "default variation '%s' is being returned",
+                name, {"target": target, "flag": identifier}, default)
+            if debug:
+                log.debug("%s_variation: returning %s (no variation found)",
+                          name, default)
             return default
 
-        try:
-            variation = self._evaluator.evaluate(identifier, target, "json")
-
-            if not variation or not variation.value:
-                log.error(
-                    "SDKCODE:6001: Failed to evaluate json variation for %s"
-                    " and the default variation '%s' is being returned",
-                    {"target": target, "flag": identifier}, default)
-                log.debug("json_variation: returning %s (no variation found)",
-                          default)
-                return default
-
-            # Only register metrics if analytics is enabled,
-            # and sometimes when the SDK starts up we can
-            # evaluate before the flag is cached which results in
-            # an empty identifier.
-            if self._config.enable_analytics and variation.identifier != "":
-                self._analytics.enqueue(target, identifier, variation)
-
-            result = json.loads(variation.value)
-            log.debug("json_variation: returning %s (variation='%s', "
-                      "value='%s')", result, variation.identifier,
-                      variation.value)
-            return result
+        # Only register metrics if analytics is enabled,
+        # and sometimes when the SDK starts up we can
+        # evaluate before the flag is cached which results in
+        # an empty identifier.
+        if self._analytics is not None and variation.identifier != "":
+            self._analytics.enqueue(target, identifier, variation)
 
-        except FlagKindMismatchException as ex:
+        result = value_of(variation, _parsed(variation, kind))
+        if result is UNPARSABLE:
             log.error(
-                "SDKCODE:6001: Failed to evaluate json variation for flag "
-                "'%s' and the default variation '%s' is being returned. "
-                "Reason: '%s'", identifier, default, str(ex))
-            log.debug("json_variation: returning %s (flag kind mismatch)",
-                      default)
+                "SDKCODE:6001: Invalid %s value for %s and the default "
+                "variation '%s' is being returned",
+                name, {"flag": identifier, "value": variation.value}, default)
             return default
 
+        if debug:
+            log.debug("%s_variation: returning %s (variation='%s', "
+                      "value='%s')", name, result, variation.identifier,
+                      variation.value)
+        return result
+
+    def evaluate_all(self, target: Target) -> Dict[str, Any]:
+        """Evaluates every flag for the target and returns the typed values
+        keyed by flag identifier"""
+        return self._evaluate_many(None, target)
+
+    def evaluate_many(self, identifiers: Iterable[str],
+                      target: Target) -> Dict[str, Any]:
+        """Evaluates the given flags for the target and returns the typed
+        values keyed by flag identifier. Flags that are not found or have
+        no variation are left out, so callers can apply their defaults."""
+        return self._evaluate_many(identifiers, target)
+
+    def _evaluate_many(self, identifiers: Optional[Iterable[str]],
+                       target: Target) -> Dict[str, Any]:
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("evaluate_many: evaluating flags=%s, target='%s'",
+                      identifiers, target.identifier)
+
+        # If initialization has failed, then the callers defaults are used
+        if self._initialized_failed or \
+                self._initialised_failed_reason[True] is not None:
+            log.error(
+                "SDKCODE:6001: Failed to evaluate flags %s and the default "
+                "variations are being returned. Reason: `Client is not "
+                "initialized: %s'",
+                identifiers, self._initialised_failed_reason[True])
+            return {}
+
+        if identifiers is None:
+            evaluations = self._evaluator.evaluate_all(target)
+        else:
+            evaluations = self._evaluator.evaluate_many(identifiers, target)
+
+        results: Dict[str, Any] = {}
+        evaluated: List[Tuple[str, Variation]] = []
+        for identifier, (kind, variation) in evaluations.items():
+            if not variation.value:
+                log.error(
+                    "SDKCODE:6001: Failed to evaluate %s variation for %s "
+                    "and the default variation is being returned",
+                    kind, {"target": target, "flag": identifier})
+                continue
+            value = _VALUE_OF.get(kind, _string_value)(
+                variation, _parsed(variation, kind))
+            if value is UNPARSABLE:
+                log.error(
+                    "SDKCODE:6001: Invalid %s value for %s, the default "
+                    "variation is being returned",
+                    kind, {"flag": identifier, "value": variation.value})
+                continue
+            results[identifier] = value
+            # An empty identifier means the flag was evaluated before it
+            # was cached, those are not registered in the metrics.
+            if variation.identifier != "":
+                evaluated.append((identifier, variation))
+
+        if evaluated and self._analytics is not None:
+            self._analytics.enqueue_many(target, evaluated)
+
+        if debug:
+            log.debug("evaluate_many: returning %s", results)
+        return results
+
+    def set_trace_targets(self, identifiers: Iterable[str]) -> None:
+        """Traces every evaluation for the given target identifiers, whatever
+        the log level, and passes each trace to the configured handler.
+        Replaces the targets traced so far, an empty list stops tracing."""
+        self._evaluator.set_trace_targets(identifiers)
+
+    def get_missing_attribute_stats(self) -> MissingAttributeStats:
+        """Returns how many times clauses looked up attributes the targets
+        did not have, per attribute and per flag, since the client started.
+        A summary is also logged once per configured interval at most."""
+        return self._evaluator.missing_attributes.stats()
+
+    def snapshot(self) -> "ClientSnapshot":
+        """Returns a view of the client that evaluates every flag against
+        the same version of the flags and segments, even if an update
+        arrives while it is in use. Take one per request or unit of work."""
+        view = self._repository.snapshot()
+        # Only a whole repository snapshot has generations consistent with
+        # every flag and segment it holds, a lazily pinned view may mix an
+        # older segment with a newer generation and must not store results.
+        result_cache = None
+        if isinstance(view, RepositorySnapshot):
+            result_cache = self._evaluator.result_cache
+        return ClientSnapshot(self, Evaluator(
+            view, result_cache,
+            trace_targets=self._evaluator.trace_targets,
+            trace_handler=self._evaluator.trace_handler,
+            missing_attributes=self._evaluator.missing_attributes))
+
     def close(self):
         sdk_codes.info_sdk_start_close()
         self._polling_processor.stop()
         if self._config.enable_stream:
             self._stream.stop()
 
-        if self._config.enable_analytics:
+        if self._analytics is not None:
             self._analytics.close()
         sdk_codes.info_sdk_close_success()
 
@@ -580,3 +485,84 @@ class CfClient(object):
 
     def __exit__(self, type, value, traceback):
         self.close()
+
+
+class ClientSnapshot(object):
+    """Evaluates flags like the client it was taken from, against one pinned
+    version of the flags and segments. Analytics are still recorded through
+    the client. Can be used as a context manager, leaving it does nothing."""
+
+    def __init__(self, client: CfClient, evaluator: Evaluator):
+        self._client = client
+        self._evaluator = evaluator
+
+    @property
+    def _config(self) -> Config:
+        return self._client._config
+
+    @property
+    def _analytics(self) -> Optional[AnalyticsService]:
+        return self._client._analytics
+
+    @property
+    def _initialized_failed(self) -> bool:
+        return self._client._initialized_failed
+
+    @property
+    def _initialised_failed_reason(self) -> Dict[bool, Optional[str]]:
+        return self._client._initialised_failed_reason
+
+    get_flag_type = CfClient.get_flag_type
+    bool_variation = CfClient.bool_variation
+    int_variation = CfClient.int_variation
+    number_variation = CfClient.number_variation
+    int_or_float_variation = CfClient.int_or_float_variation
+    string_variation = CfClient.string_variation
+    json_variation = CfClient.json_variation
+    evaluate_all = CfClient.evaluate_all
+    evaluate_many = CfClient.evaluate_many
+    _variation = CfClient._variation
+    _evaluate_many = CfClient._evaluate_many
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+def _parsed(variation: Variation, kind: FeatureConfigKind) -> Any:
+    if type(variation) is CompiledVariation:
+        return variation.parsed
+    return parse_value(kind, variation.value)
+
+
+# Conversions of the parsed value of a variation, UNPARSABLE when the value
+# is not valid for the variation method
+def _int_value(variation: Variation, value: Any) -> Any:
+    return value if type(value) is int else UNPARSABLE
+
+
+def _number_value(variation: Variation, value: Any) -> Any:
+    return value if value is UNPARSABLE else float(value)
+
+
+def _parsed_value(variation: Variation, value: Any) -> Any:
+    return value
+
+
+def _string_value(variation: Variation, value: Any) -> Any:
+    return variation.value
+
+
+def _json_value(variation: Variation, value: Any) -> Any:
+    return json_values.view(value)
+
+
+# Converts the variation of a flag of each kind to its Python value
+_VALUE_OF: Dict[str, Callable[[Variation, Any], Any]] = {
+    FeatureConfigKind.BOOLEAN: _parsed_value,
+    FeatureConfigKind.INT: _parsed_value,
+    FeatureConfigKind.STRING: _string_value,
+    FeatureConfigKind.JSON: _json_value,
+}
@@ -1,10 +1,10 @@
 """Configuration is a base class that has default values that you can change
 during the instance of the client class"""
 
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Iterable, Optional
 
 from .interface import Cache
-from .lru_cache import LRUCache
+from .unbounded_cache import UnboundedCache
 from .util import log
 
 BASE_URL = "https://config.ff.harness.io/api/1.0"
@@ -13,6 +13,7 @@ MINUTE = 60
 PULL_INTERVAL = 1 * MINUTE
 PERSIST_INTERVAL = 1 * MINUTE
 EVENTS_SYNC_INTERVAL = 1 * MINUTE
+MISSING_ATTRIBUTES_INTERVAL = 1 * MINUTE
 
 
 class Config(object):
@@ -30,6 +31,12 @@ class Config(object):
             max_auth_retries: int = 10,
             tls_trusted_cas_file: str = None,
             httpx_args: Dict[str, Any] = None,
+            evaluation_cache_size: int = 0,
+            evaluation_cache_ttl: Optional[float] = None,
+            snapshot_repository: Optional[bool] = None,
+            trace_targets: Iterable[str] = (),
+            trace_handler: Optional[Callable] = None,
+            missing_attributes_interval: float = MISSING_ATTRIBUTES_INTERVAL,
     ):
         self.base_url = base_url
         self.events_url = events_url
@@ -44,7 +51,8 @@ class Config(object):
 
         self.cache = cache
         if self.cache is None:
-            self.cache = LRUCache()
+            # Flags and segments are never evicted, see UnboundedCache
+            self.cache = UnboundedCache()
         self.store = store
         self.enable_stream = enable_stream
         self.enable_analytics = enable_analytics
@@ -53,6 +61,16 @@ class Config(object):
         self.httpx_args = httpx_args
         if self.httpx_args is None:
             self.httpx_args = {}
+        self.evaluation_cache_size = evaluation_cache_size
+        self.evaluation_cache_ttl = evaluation_cache_ttl
+        # Unless a cache is given, flags and segments are kept in a
+        # SnapshotRepository, whose snapshots cost nothing to take
+        if snapshot_repository is None:
+            snapshot_repository = cache is None
+        self.snapshot_repository = snapshot_repository
+        self.trace_targets = trace_targets
+        self.trace_handler = trace_handler
+        self.missing_attributes_interval = missing_attributes_interval
 
 
 default_config = Config()
@@ -125,3 +143,61 @@ def with_httpx_args(args: Dict[str, Any]) -> Callable:
         config.httpx_args.update(args)
 
     return func
+
+
+def with_evaluation_cache(size: int, ttl: Optional[float] = None) -> Callable:
+    """
+    Caches up to `size` evaluation results per target and flag, optionally
+    expiring them after `ttl` seconds. Results are invalidated automatically
+    when a flag, or a segment or prerequisite it depends on, is updated.
+    """
+
+    def func(config: Config) -> None:
+        config.evaluation_cache_size = size
+        config.evaluation_cache_ttl = ttl
+
+    return func
+
+
+def with_snapshot_repository(value: bool = True) -> Callable:
+    """
+    Keeps flags and segments in an immutable snapshot that is replaced on
+    every update instead of the shared cache. Evaluations never lock and
+    client snapshots cost nothing to take. Enabled by default unless a
+    `cache` is given, which is not used when this is enabled.
+    """
+
+    def func(config: Config) -> None:
+        config.snapshot_repository = value
+
+    return func
+
+
+def with_evaluation_trace(targets: Iterable[str],
+                          handler: Optional[Callable] = None) -> Callable:
+    """
+    Records every step of the evaluations for the given target identifiers,
+    without enabling debug logging for all targets. Each completed trace is
+    passed to `handler`, by default it is logged at INFO level. Tracing can
+    be changed at runtime with `CfClient.set_trace_targets`.
+    """
+
+    def func(config: Config) -> None:
+        config.trace_targets = targets
+        config.trace_handler = handler
+
+    return func
+
+
+def with_missing_attributes_interval(value: float) -> Callable:
+    """
+    Attributes that clauses look up but targets do not have are counted
+    rather than logged on each evaluation. A summary warning of the counts is
+    logged at most once every `value` seconds, the totals are available from
+    `CfClient.get_missing_attribute_stats`.
+    """
+
+    def func(config: Config) -> None:
+        config.missing_attributes_interval = value
+
+    return func
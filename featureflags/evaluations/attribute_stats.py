@@ -0,0 +1,77 @@
+"""Aggregated diagnostics for attributes missing from targets.
+
+A clause referencing an attribute the target does not have simply does not
+match. Logging that on every evaluation floods the logs of busy services, so
+the evaluator counts the lookups instead, per attribute and per flag, and
+logs one summary warning per interval at most."""
+
+import time
+from collections import Counter
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+import attr
+
+from featureflags.util import log
+
+SUMMARY_INTERVAL = 60
+# Attributes listed in a summary warning, the most frequently missing first
+SUMMARY_SIZE = 10
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class MissingAttributeStats:
+    """Counts of missing attribute lookups since the stats were created or
+    last reset, by attribute and by flag identifier then attribute"""
+    attributes: Dict[str, int]
+    flags: Dict[str, Dict[str, int]]
+
+
+class MissingAttributes(object):
+
+    def __init__(self, interval: float = SUMMARY_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.interval = interval
+        self._clock = clock
+        self._lock = Lock()
+        self._attributes: Counter = Counter()
+        self._flags: Dict[str, Counter] = {}
+        # Lookups since the last summary was logged, the first lookup is
+        # logged straight away
+        self._pending: Counter = Counter()
+        self._last_summary: Optional[float] = None
+
+    def record(self, attribute: str, flag: Optional[str] = None) -> None:
+        """Counts one lookup of an attribute the target does not have while
+        evaluating `flag`, logging a summary if the interval has elapsed"""
+        now = self._clock()
+        with self._lock:
+            self._attributes[attribute] += 1
+            if flag is not None:
+                counts = self._flags.get(flag)
+                if counts is None:
+                    counts = self._flags[flag] = Counter()
+                counts[attribute] += 1
+            self._pending[attribute] += 1
+            if self._last_summary is not None and \
+                    now - self._last_summary < self.interval:
+                return
+            pending = self._pending
+            self._pending = Counter()
+            self._last_summary = now
+        log.warning("Attributes missing from targets since the last report, "
+                    "with the number of lookups: %s", ", ".join(
+                        "%s (%d)" % item
+                        for item in pending.most_common(SUMMARY_SIZE)))
+
+    def stats(self) -> MissingAttributeStats:
+        with self._lock:
+            return MissingAttributeStats(
+                attributes=dict(self._attributes),
+                flags={flag: dict(counts)
+                       for flag, counts in self._flags.items()})
+
+    def reset(self) -> None:
+        with self._lock:
+            self._attributes.clear()
+            self._flags.clear()
@@ -67,16 +67,14 @@ class Target():
 
     def get_attr_value(self, attribute: str) -> Optional[str]:
         if not attribute:
-            log.debug("Attribute is empty")
+            # Segment match clauses have no attribute
             return None
         result: Any = getattr(self, attribute, None)
         if not result and not isinstance(self.attributes,
                                          Unset):
-            log.debug("Checking attributes field %s", attribute)
+            # Missing attributes are counted by the evaluator, see
+            # featureflags.evaluations.attribute_stats
             result = self.attributes.get(attribute, None)
-            if result is None:
-                log.warning("Attribute %s does not exist", attribute)
-        log.debug("Target %s attribute %s value %s", self, attribute, result)
         return result
 
     def get_type(self, attribute: str) -> Optional[Interface]:
@@ -86,5 +84,6 @@ class Target():
                 operator = TYPES.get(_type, None)
                 if operator:
                     return klass(value)
-        log.debug("Unsupported type found on attribute %s", attribute)
+        if value is not None:
+            log.debug("Unsupported type found on attribute %s", attribute)
         return None
@@ -0,0 +1,386 @@
+"""Pre-resolved evaluation plans.
+
+Flags and segments are compiled once when they are stored in the
+repository, so the evaluator never has to deal with ``Unset`` values,
+operator names or linear lookups over the openapi models.
+
+The plans are also what the repository keeps in memory: slotted classes,
+tuples, interned strings and identifier sets. The openapi model a plan was
+compiled from is kept compressed and decoded on request, unless a Store
+already holds the model, in which case the plan keeps a reference to it."""
+
+import io
+import itertools
+import json
+import pickle
+import zlib
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import attr
+
+from featureflags.evaluations.constants import (CONTAINS_OPERATOR,
+                                                ENDS_WITH_OPERATOR,
+                                                EQUAL_OPERATOR,
+                                                EQUAL_SENSITIVE_OPERATOR,
+                                                GT_OPERATOR, IN_OPERATOR,
+                                                MATCH_OPERATOR,
+                                                SEGMENT_MATCH_OPERATOR,
+                                                STARTS_WITH_OPERATOR)
+from featureflags.evaluations.json_values import freeze
+from featureflags.evaluations.predicates import compile_predicate
+from featureflags.openapi.config.models.clause import Clause
+from featureflags.openapi.config.models.distribution import Distribution
+from featureflags.openapi.config.models.feature_config import (
+    FeatureConfig, FeatureConfigKind)
+from featureflags.openapi.config.models.feature_state import FeatureState
+from featureflags.openapi.config.models.segment import Segment
+from featureflags.openapi.config.models.serve import Serve
+from featureflags.openapi.config.models.variation import Variation
+from featureflags.openapi.config.types import UNSET, Unset
+from featureflags.util import intern_str
+
+# Clause operators mapped to the ftypes Interface method implementing them
+OPERATORS: Dict[str, str] = {
+    IN_OPERATOR.lower(): "in_list",
+    EQUAL_OPERATOR.lower(): "equal",
+    GT_OPERATOR.lower(): "greater_than",
+    STARTS_WITH_OPERATOR.lower(): "starts_with",
+    ENDS_WITH_OPERATOR.lower(): "ends_with",
+    CONTAINS_OPERATOR.lower(): "contains",
+    EQUAL_SENSITIVE_OPERATOR.lower(): "equal_sensitive",
+    MATCH_OPERATOR.lower(): "match",
+}
+
+SEGMENT_MATCH = SEGMENT_MATCH_OPERATOR.lower()
+
+# Parsed value of a variation whose value is not valid for the flag kind
+UNPARSABLE: Any = object()
+
+# Every compiled flag and segment gets a unique, increasing revision so that
+# derived data such as the memos of an evaluation context can tell when a
+# flag or segment has been replaced, even if its config version is unset.
+_revisions = itertools.count(1)
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledClause:
+    attribute: str
+    op: str
+    values: Tuple[str, ...]
+    # Operator with the clause values folded in, taking the typed target
+    # attribute. None when the operator is unknown or is a segment match
+    predicate: Optional[Callable[[Any], bool]] = None
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledWeightedVariation:
+    variation: str
+    weight: int
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledDistribution:
+    bucket_by: str
+    variations: Tuple[CompiledWeightedVariation, ...]
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledServe:
+    distribution: Optional[CompiledDistribution] = None
+    variation: Optional[str] = None
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledRule:
+    priority: int
+    clauses: Tuple[CompiledClause, ...]
+    serve: CompiledServe
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledVariationMap:
+    variation: str
+    target_segments: Tuple[str, ...]
+
+
+@attr.s(auto_attribs=True, slots=True, eq=False)
+class CompiledVariation(Variation):
+    """A flag variation with its value parsed to the Python type of the flag
+    kind when the flag is compiled, see parse_value. Compares equal to a
+    Variation with the same fields."""
+    parsed: Any = None
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Variation):
+            return NotImplemented
+        return self.identifier == other.identifier and \
+            self.value == other.value and self.name == other.name and \
+            self.description == other.description and \
+            self.additional_properties == other.additional_properties
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledPrerequisite:
+    feature: str
+    variations: FrozenSet[str]
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledFlag:
+    feature: str
+    kind: FeatureConfigKind
+    enabled: bool
+    off_variation: Optional[str]
+    default_serve: CompiledServe
+    rules: Tuple[CompiledRule, ...]
+    prerequisites: Tuple[CompiledPrerequisite, ...]
+    # Individually targeted identifiers mapped to their variation
+    target_variations: Dict[str, str]
+    # Variation maps that target segments, in the order they were defined
+    variation_to_target_map: Tuple[CompiledVariationMap, ...]
+    variations: Dict[str, CompiledVariation]
+    # Identifiers of all segments referenced by the flag
+    segments: FrozenSet[str]
+    version: Optional[int]
+    revision: int
+    # The model compressed by _encode, or the model itself, see compile_flag
+    source: Any = attr.ib(repr=False)
+
+    @property
+    def config(self) -> FeatureConfig:
+        """The flag as it was stored, a new copy on every access"""
+        return _copy_source(self.source)
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompiledSegment:
+    identifier: str
+    name: str
+    included: FrozenSet[str]
+    excluded: FrozenSet[str]
+    # Legacy rules, a target matches if any clause matches
+    rules: Tuple[CompiledClause, ...]
+    # Enhanced rules, a target matches if all clauses of any rule match
+    serving_rules: Tuple[Tuple[CompiledClause, ...], ...]
+    # Identifiers of segments referenced by segmentMatch clauses
+    segments: FrozenSet[str]
+    version: Optional[int]
+    revision: int
+    # The model compressed by _encode, or the model itself, see compile_flag
+    source: Any = attr.ib(repr=False)
+
+    @property
+    def config(self) -> Segment:
+        """The segment as it was stored, a new copy on every access"""
+        return _copy_source(self.source)
+
+
+class _ModelPickler(pickle.Pickler):
+    # The models compare fields against the UNSET singleton by identity
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        return "UNSET" if obj is UNSET else None
+
+
+class _ModelUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid: Any) -> Any:
+        if pid == "UNSET":
+            return UNSET
+        raise pickle.UnpicklingError(f"unsupported persistent id {pid}")
+
+
+def _dumps(model: Any) -> bytes:
+    # Only ever loaded by _loads, the data never leaves the process
+    buffer = io.BytesIO()
+    _ModelPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(model)
+    return buffer.getvalue()
+
+
+def _loads(data: bytes) -> Any:
+    return _ModelUnpickler(io.BytesIO(data)).load()
+
+
+def _encode(model: Any) -> bytes:
+    return zlib.compress(_dumps(model))
+
+
+def _decode(source: bytes) -> Any:
+    return _loads(zlib.decompress(source))
+
+
+def _copy_source(source: Any) -> Any:
+    if isinstance(source, bytes):
+        return _decode(source)
+    return _loads(_dumps(source))
+
+
+def _unset_to(value: Any, default: Any) -> Any:
+    if isinstance(value, Unset) or value is None:
+        return default
+    return value
+
+
+def _referenced_segments(clauses: Any) -> FrozenSet[str]:
+    return frozenset(intern_str(value) for clause in clauses
+                     if clause.op == SEGMENT_MATCH for value in clause.values)
+
+
+def compile_clause(clause: Clause) -> CompiledClause:
+    op = (clause.op or "").lower()
+    values = clause.values or []
+    predicate = None
+    method = OPERATORS.get(op)
+    if method and values:
+        predicate = compile_predicate(method, values)
+    return CompiledClause(attribute=intern_str(clause.attribute),
+                          op=intern_str(op),
+                          values=tuple(values),
+                          predicate=predicate)
+
+
+def compile_distribution(distribution: Any) -> \
+        Optional[CompiledDistribution]:
+    if not isinstance(distribution, Distribution):
+        return None
+    return CompiledDistribution(
+        bucket_by=intern_str(distribution.bucket_by),
+        variations=tuple(
+            CompiledWeightedVariation(variation=intern_str(wv.variation),
+                                      weight=wv.weight)
+            for wv in distribution.variations))
+
+
+def compile_serve(serve: Serve) -> CompiledServe:
+    return CompiledServe(
+        distribution=compile_distribution(serve.distribution),
+        variation=intern_str(_unset_to(serve.variation, None) or None),
+    )
+
+
+def _by_priority(rules: Any) -> List[Any]:
+    return sorted(_unset_to(rules, []), key=lambda rule: rule.priority)
+
+
+def parse_value(kind: FeatureConfigKind, value: Any) -> Any:
+    """Converts a variation value to the Python type of the flag kind, or
+    returns UNPARSABLE. Int flags hold floats too, values that are not an
+    integer are parsed as a float. JSON values are frozen, see
+    featureflags.evaluations.json_values."""
+    if not isinstance(value, str):
+        return UNPARSABLE
+    if kind == FeatureConfigKind.BOOLEAN:
+        return value.lower() == "true"
+    if kind == FeatureConfigKind.INT:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            return UNPARSABLE
+    if kind == FeatureConfigKind.JSON:
+        try:
+            return freeze(json.loads(value))
+        except ValueError:
+            return UNPARSABLE
+    return value
+
+
+def compile_flag(fc: FeatureConfig, encode: bool = True) -> CompiledFlag:
+    """Compiles the flag into its evaluation plan. With `encode` False the
+    plan references `fc` instead of a compressed copy, for callers that keep
+    the model anyway and must not pay for compressing it."""
+    rules = tuple(
+        CompiledRule(
+            priority=rule.priority,
+            clauses=tuple(compile_clause(clause)
+                          for clause in _unset_to(rule.clauses, [])),
+            serve=compile_serve(rule.serve),
+        )
+        for rule in _by_priority(fc.rules)
+    )
+
+    variation_maps = _unset_to(fc.variation_to_target_map, [])
+
+    # The first variation map listing a target wins
+    target_variations: Dict[str, str] = {}
+    for vm in variation_maps:
+        for t in _unset_to(vm.targets, []):
+            if not isinstance(t, Unset):
+                target_variations.setdefault(t.identifier,
+                                             intern_str(vm.variation))
+
+    variation_to_target_map = tuple(
+        CompiledVariationMap(
+            variation=intern_str(vm.variation),
+            target_segments=tuple(intern_str(s) for s in vm.target_segments),
+        )
+        for vm in variation_maps if _unset_to(vm.target_segments, [])
+    )
+
+    prerequisites = tuple(
+        CompiledPrerequisite(feature=intern_str(pqs.feature),
+                             variations=frozenset(intern_str(v)
+                                                  for v in pqs.variations))
+        for pqs in _unset_to(fc.prerequisites, [])
+    )
+
+    # Keep the first variation when identifiers are duplicated
+    variations: Dict[str, CompiledVariation] = {}
+    for variation in fc.variations:
+        identifier = intern_str(variation.identifier)
+        if identifier in variations:
+            continue
+        variations[identifier] = CompiledVariation(
+            identifier=identifier,
+            value=variation.value,
+            name=variation.name,
+            description=variation.description,
+            parsed=parse_value(fc.kind, variation.value),
+        )
+
+    return CompiledFlag(
+        feature=intern_str(fc.feature),
+        kind=fc.kind,
+        enabled=fc.state == FeatureState.ON,
+        off_variation=intern_str(fc.off_variation),
+        default_serve=compile_serve(fc.default_serve),
+        rules=rules,
+        prerequisites=prerequisites,
+        target_variations=target_variations,
+        variation_to_target_map=variation_to_target_map,
+        variations=variations,
+        segments=_referenced_segments(
+            clause for rule in rules for clause in rule.clauses).union(
+            *(vm.target_segments for vm in variation_to_target_map)),
+        version=_unset_to(fc.version, None),
+        revision=next(_revisions),
+        source=_encode(fc) if encode else fc,
+    )
+
+
+def compile_segment(segment: Segment, encode: bool = True) -> \
+        CompiledSegment:
+    """Compiles the segment into its evaluation plan, see compile_flag"""
+    rules = tuple(compile_clause(clause)
+                  for clause in _unset_to(segment.rules, []))
+    serving_rules = tuple(
+        tuple(compile_clause(clause)
+              for clause in _unset_to(rule.clauses, []))
+        for rule in _by_priority(segment.serving_rules)
+    )
+    return CompiledSegment(
+        identifier=intern_str(segment.identifier),
+        name=segment.name,
+        included=frozenset(t.identifier
+                           for t in _unset_to(segment.included, [])),
+        excluded=frozenset(t.identifier
+                           for t in _unset_to(segment.excluded, [])),
+        rules=rules,
+        serving_rules=serving_rules,
+        segments=_referenced_segments(
+            rules + tuple(c for clauses in serving_rules for c in clauses)),
+        version=_unset_to(segment.version, None),
+        revision=next(_revisions),
+        source=_encode(segment) if encode else segment,
+    )
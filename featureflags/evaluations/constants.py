@@ -8,3 +8,4 @@ STARTS_WITH_OPERATOR = "starts_with"
 ENDS_WITH_OPERATOR = "ends_with"
 CONTAINS_OPERATOR = "contains"
 EQUAL_SENSITIVE_OPERATOR = "equal_sensitive"
+MATCH_OPERATOR = "match"
@@ -0,0 +1,76 @@
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set, Tuple
+
+from featureflags.evaluations.trace import EvaluationTrace
+from featureflags.ftypes.interface import Interface
+from featureflags.util import log
+
+if TYPE_CHECKING:
+    from featureflags.evaluations.auth_target import Target
+    from featureflags.evaluations.compiled import (CompiledFlag,
+                                                   CompiledSegment)
+    from featureflags.openapi.config.models.variation import Variation
+
+
+class EvaluationContext(object):
+    """Per-target state shared by every flag evaluated in one pass.
+
+    The Evaluator creates one per top-level evaluation so that
+    prerequisites reuse the work of their parent flag, and bulk callers can
+    pass the same context to evaluate several flags for the same target.
+    A context must not be shared between different targets."""
+
+    def __init__(
+            self,
+            compiled_flags: Optional[Dict[str, Optional['CompiledFlag']]]
+            = None,
+            compiled_segments:
+            Optional[Dict[str, Optional['CompiledSegment']]] = None,
+            trace: Optional[EvaluationTrace] = None
+    ) -> None:
+        # Flags and segments resolved up front by batch evaluations and
+        # shared between the contexts of every target in the batch. The
+        # evaluator uses these instead of querying the repository.
+        self.compiled_flags = compiled_flags
+        self.compiled_segments = compiled_segments
+        # Segment identifier mapped to the revision of the segment that was
+        # checked and the outcome: True when the target is included, False
+        # when it is excluded and None when it did not match.
+        self.segments: Dict[str, Tuple[int, Optional[bool]]] = {}
+        # Attribute name mapped to its typed wrapper, or None when the
+        # attribute is missing or of an unsupported type.
+        self.attributes: Dict[str, Optional[Interface]] = {}
+        # (bucket_by, attribute value) mapped to the percentage rollout
+        # bucket it hashes to.
+        self.buckets: Dict[Tuple[str, str], int] = {}
+        # Flag identifier mapped to the flag revision and its variation, and
+        # to the flag revision and whether its prerequisites are met.
+        self.variations: Dict[str, Tuple[int, 'Variation']] = {}
+        self.prerequisites: Dict[str, Tuple[int, bool]] = {}
+        # Flags whose prerequisites are being checked, used to detect cycles
+        self.checking: Set[str] = set()
+        # Flag being evaluated, missing attributes are counted against it
+        self.flag: Optional[str] = None
+        # Trace of a target picked for tracing, and whether record does
+        # anything at all. Call sites check tracing before calling record,
+        # so disabled diagnostics cost one attribute check.
+        self.trace = trace
+        self.tracing = trace is not None or log.isEnabledFor(logging.DEBUG)
+
+    def record(self, message: str, *args: Any) -> None:
+        """Logs a debug message and adds it to the trace, if any"""
+        if self.trace is not None:
+            self.trace.events.append((message, args))
+        log.debug(message, *args)
+
+    def get_type(self, target: 'Target',
+                 attribute: str) -> Optional[Interface]:
+        try:
+            return self.attributes[attribute]
+        except KeyError:
+            operator = target.get_type(attribute)
+            self.attributes[attribute] = operator
+            if self.tracing:
+                self.record("Target '%s' attribute '%s' is %s",
+                            target.identifier, attribute, operator)
+            return operator
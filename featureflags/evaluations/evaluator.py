@@ -1,27 +1,27 @@
 import logging
-from typing import Dict, List, Optional, Union
+from typing import (Any, Dict, FrozenSet, Hashable, Iterable, Iterator,
+                    List, Optional, Sequence, Tuple)
 
 import mmh3
 
+from featureflags.evaluations.attribute_stats import MissingAttributes
 from featureflags.evaluations.auth_target import Target
-from featureflags.evaluations.constants import (CONTAINS_OPERATOR,
-                                                ENDS_WITH_OPERATOR,
-                                                EQUAL_OPERATOR,
-                                                EQUAL_SENSITIVE_OPERATOR,
-                                                GT_OPERATOR, IN_OPERATOR,
-                                                ONE_HUNDRED,
-                                                SEGMENT_MATCH_OPERATOR,
-                                                STARTS_WITH_OPERATOR)
+from featureflags.evaluations.compiled import (SEGMENT_MATCH, CompiledClause,
+                                               CompiledDistribution,
+                                               CompiledFlag, CompiledRule,
+                                               CompiledSegment)
+from featureflags.evaluations.constants import ONE_HUNDRED
+from featureflags.evaluations.context import EvaluationContext
+from featureflags.evaluations.result_cache import ResultCache
+from featureflags.evaluations.trace import (EvaluationTrace, TraceHandler,
+                                            log_trace)
 from featureflags.openapi.config.models.clause import Clause
-from featureflags.openapi.config.models.distribution import Distribution
-from featureflags.openapi.config.models.feature_config import (
-    FeatureConfig, FeatureConfigKind)
-from featureflags.openapi.config.models.feature_state import FeatureState
+from featureflags.openapi.config.models.feature_config import \
+    FeatureConfigKind
 from featureflags.openapi.config.models.segment import Segment
 from featureflags.openapi.config.models.serve import Serve
 from featureflags.openapi.config.models.serving_rule import ServingRule
 from featureflags.openapi.config.models.variation import Variation
-from featureflags.openapi.config.models.variation_map import VariationMap
 from featureflags.openapi.config.types import Unset
 from featureflags.repository import QueryInterface
 from featureflags.util import log
@@ -83,372 +83,702 @@ class FlagKindMismatchException(Exception):
 
 class Evaluator(object):
 
-    def __init__(self, provider: QueryInterface):
+    def __init__(self, provider: QueryInterface,
+                 result_cache: Optional[ResultCache] = None,
+                 trace_targets: Iterable[str] = (),
+                 trace_handler: TraceHandler = log_trace,
+                 missing_attributes: Optional[MissingAttributes] = None):
         self.provider = provider
+        self.result_cache = result_cache
+        # Lookups of attributes the targets do not have, see
+        # featureflags.evaluations.attribute_stats
+        self.missing_attributes = missing_attributes or MissingAttributes()
+        # Evaluations for these target identifiers are traced, see
+        # featureflags.evaluations.trace
+        self.trace_targets: FrozenSet[str] = frozenset(trace_targets)
+        self.trace_handler = trace_handler
+
+    def set_trace_targets(self, identifiers: Iterable[str]) -> None:
+        """Traces the evaluations of the given targets from now on, replacing
+        the targets traced so far. An empty list turns tracing off."""
+        self.trace_targets = frozenset(identifiers)
 
     def get_kind(self, identifier) -> Optional[FeatureConfigKind]:
-        fc = self.provider.get_flag(identifier)
-        if not fc:
+        flag = self.provider.get_compiled_flag(identifier)
+        if not flag:
             return None
-        return fc.kind
+        return flag.kind
 
-    def _find_variation(self, variations: List[Variation],
-                        identifier: Optional[str]) -> Variation:
+    def _find_variation(self, variations: Dict[str, Variation],
+                        identifier: Optional[str],
+                        context: Optional[EvaluationContext] = None) -> \
+            Variation:
         if not identifier:
-            log.debug("Empty identifier %s or variations %s occurred",
-                      identifier, variations)
+            if context and context.tracing:
+                context.record("Empty identifier %s occurred", identifier)
             return EMPTY_VARIATION
-        variation = next(
-            (val for val in variations if val.identifier == identifier),
-            EMPTY_VARIATION
-        )
-        log.debug("Variation %s found in variations %s",
-                  identifier, variations)
+        variation = variations.get(identifier, EMPTY_VARIATION)
+        if context and context.tracing:
+            context.record("Variation %s found in variations", identifier)
         return variation
 
     def _get_normalized_number(self, bucket_by: str, identifier: str):
-        value = ":".join([bucket_by, identifier])
-        hash = int(mmh3.hash(value, signed=False))
-        normalized_number = (hash % ONE_HUNDRED) + 1
-        log.debug("MM3 normalized number for %s = %d", value,
-                  normalized_number)
+        value = bucket_by + ":" + identifier
+        normalized_number = (mmh3.hash(value, signed=False) % ONE_HUNDRED) + 1
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("MM3 normalized number for %s = %d", value,
+                      normalized_number)
         return normalized_number
 
-    def _is_enabled(self, target: Target, bucket_by: str,
-                    percentage: int) -> bool:
+    def _get_bucket(self, target: Target, bucket_by: str,
+                    context: Optional[EvaluationContext] = None) -> \
+            Optional[int]:
+        """Returns the bucket of the target between 1 and 100, or None when
+        neither the bucket_by attribute nor the identifier is set"""
         attr_value = target.get_attr_value(bucket_by)
         if not attr_value:
-            log.debug("Returns False. %s is set to %s", bucket_by, attr_value)
+            if context and context.tracing:
+                context.record("Returns False. %s is set to %s", bucket_by,
+                               attr_value)
             old_bb = bucket_by
             bucket_by = "identifier"
             attr_value = target.get_attr_value(bucket_by)
             if not attr_value or attr_value == "":
-                return False
+                return None
             log.warning("SDKCODE:6002 BucketBy attribute not found in "
                         "target attributes, falling back to 'identifier':"
                         " missing=%s, using value=%s", old_bb, attr_value)
 
-        bucket_id = self._get_normalized_number(bucket_by, attr_value)
-        log.debug("MM3 percentage_check=%d bucket_by=%s value=%s bucket=%d",
-                  percentage, bucket_by, attr_value, bucket_id)
-        return percentage > 0 and bucket_id <= percentage
+        if context is None or not isinstance(attr_value, str):
+            return self._get_normalized_number(bucket_by, attr_value)
+
+        key = (bucket_by, attr_value)
+        bucket_id = context.buckets.get(key)
+        if bucket_id is None:
+            bucket_id = self._get_normalized_number(bucket_by, attr_value)
+            context.buckets[key] = bucket_id
+        return bucket_id
 
-    def _evaluate_distribution(self, distribution: Distribution,
-                               target: Target) -> Optional[str]:
+    def _evaluate_distribution(
+            self, distribution: CompiledDistribution, target: Target,
+            context: Optional[EvaluationContext] = None) -> Optional[str]:
         variation = None
         if not distribution:
-            log.debug("Distribution is empty")
+            if context and context.tracing:
+                context.record("Distribution is empty")
             return variation
+        if not distribution.variations:
+            return variation
+
+        # The bucket only depends on the target, so it is computed once and
+        # compared against the running total of each variation's weight
+        bucket_id = self._get_bucket(target, distribution.bucket_by, context)
         total_percentage = 0
         for _variation in distribution.variations:
             variation = _variation.variation
-            log.debug("Checking variation %s", variation)
             total_percentage += _variation.weight
-            if self._is_enabled(target, distribution.bucket_by,
-                                total_percentage):
-                log.debug("Enabled for distribution %s", distribution)
+            if bucket_id is not None and 0 < total_percentage and \
+                    bucket_id <= total_percentage:
+                if context and context.tracing:
+                    context.record("Enabled for distribution bucket_by %s "
+                                   "bucket=%d variation=%s",
+                                   distribution.bucket_by, bucket_id,
+                                   variation)
                 return variation
-        log.debug("Variation of distribution evaluation %s", variation)
+        if context and context.tracing:
+            context.record("Variation of distribution evaluation %s",
+                           variation)
         return variation
 
-    def _check_target_in_segment(self, segments: List[str],
-                                 target: Target) -> bool:
-        log.debug("_check_target_in_segment: target='%s', segments=%s",
-                  target.identifier, segments)
+    def _check_target_in_segment(
+            self, segments: Sequence[str], target: Target,
+            context: Optional[EvaluationContext] = None) -> bool:
+        if context and context.tracing:
+            context.record("_check_target_in_segment: target='%s', "
+                           "segments=%s", target.identifier, segments)
 
         for segment_identifier in segments:
-            segment = self.provider.get_segment(segment_identifier)
-
-            if segment:
-                # Should Target be excluded - if in excluded
-                # list we return false
-                if not isinstance(segment.excluded, Unset) and \
-                        next(
-                            (val for val in segment.excluded
-                             if val.identifier == target.identifier),
-                            None) is not None:
-                    log.debug("Target '%s' EXCLUDED from segment '%s'",
-                              target.identifier, segment.name)
-                    return False
-
-                # Should Target be included - if in included list
-                #  we return true
-                if not isinstance(segment.included, Unset) and \
-                        next(
-                            (val for val in segment.included
-                             if val.identifier == target.identifier),
-                            None) is not None:
-                    log.debug("Target '%s' INCLUDED in segment '%s'",
-                              target.identifier, segment.name)
-                    return True
+            segment = self._get_compiled_segment(segment_identifier, context)
+            if not segment:
+                continue
 
-                if segment.serving_rules:
-                    # Use enhanced rules first if they're available
-                    log.debug('Found and using enhanced serving_rules')
-
-                    for serving_rule in segment.serving_rules:
-                        if self._evaluate_clauses_v2(serving_rule.clauses,
-                                                     target):
-                            log.debug("Target '%s' matched segment '%s' "
-                                      "via serving rule",
-                                      target.identifier, segment_identifier)
-                            return True
-
-                else:
-                    # Fall back to legacy rules
-                    # Should Target be included via segment rules
-                    if segment.rules and self._evaluate_clauses(segment.rules,
-                                                                target):
-                        log.debug(
-                            'Target %s included in segment %s via rules\n',
-                            target.name, segment.name)
-                        return True
-
-        log.debug("Target '%s' not found in any segment", target.identifier)
+            membership = None
+            memo = context.segments.get(segment_identifier) \
+                if context else None
+            if memo and memo[0] == segment.revision:
+                membership = memo[1]
+                if context and context.tracing:
+                    context.record("Target '%s' membership of segment '%s' "
+                                   "is %s (memoized)", target.identifier,
+                                   segment_identifier, membership)
+            else:
+                membership = self._segment_membership(segment, target,
+                                                      context)
+                if context:
+                    context.segments[segment_identifier] = (segment.revision,
+                                                            membership)
+
+            if membership is not None:
+                return membership
+
+        if context and context.tracing:
+            context.record("Target '%s' not found in any segment",
+                           target.identifier)
         return False
 
-    def _evaluate_clause(self, clause: Clause, target: Target) -> bool:
-        if clause.op is None:
-            log.debug("Clause is empty")
+    def _segment_membership(self, segment: CompiledSegment, target: Target,
+                            context: Optional[EvaluationContext] = None) \
+            -> Optional[bool]:
+        """Returns False if the target is excluded from the segment, True if
+        it is included or matches its rules and None otherwise"""
+        # Should Target be excluded - if in excluded
+        # list we return false
+        if target.identifier in segment.excluded:
+            if context and context.tracing:
+                context.record("Target '%s' EXCLUDED from segment '%s'",
+                               target.identifier, segment.name)
             return False
 
+        # Should Target be included - if in included list
+        #  we return true
+        if target.identifier in segment.included:
+            if context and context.tracing:
+                context.record("Target '%s' INCLUDED in segment '%s'",
+                               target.identifier, segment.name)
+            return True
+
+        if segment.serving_rules:
+            # Use enhanced rules first if they're available
+            if context and context.tracing:
+                context.record('Found and using enhanced serving_rules')
+
+            for clauses in segment.serving_rules:
+                if self._evaluate_clauses_v2(clauses, target, context):
+                    if context and context.tracing:
+                        context.record("Target '%s' matched segment '%s' "
+                                       "via serving rule",
+                                       target.identifier, segment.identifier)
+                    return True
+
+        else:
+            # Fall back to legacy rules
+            # Should Target be included via segment rules
+            if segment.rules and self._evaluate_clauses(segment.rules,
+                                                        target, context):
+                if context and context.tracing:
+                    context.record(
+                        'Target %s included in segment %s via rules\n',
+                        target.name, segment.name)
+                return True
+        return None
+
+    def _evaluate_clause(self, clause: CompiledClause, target: Target,
+                         context: Optional[EvaluationContext] = None) -> bool:
         if not clause.values:
-            log.debug("Clause values is empty")
+            if context and context.tracing:
+                context.record("Clause values is empty")
+            return False
+
+        segment_match = clause.op == SEGMENT_MATCH
+        if clause.predicate is None and not segment_match:
+            if context and context.tracing:
+                context.record("Unknown clause operator %s", clause.op)
             return False
 
-        operator = clause.op.lower()
-        type = target.get_type(clause.attribute)
+        if context:
+            type = context.get_type(target, clause.attribute)
+        else:
+            type = target.get_type(clause.attribute)
 
         try:
             if type is None:
-                if operator == SEGMENT_MATCH_OPERATOR.lower():
-                    log.debug("Clause operator is %s, evaluate on segment",
-                              operator)
-                    return self._check_target_in_segment(clause.values, target)
-                log.debug("Attribute type %s is none return false", type)
+                if segment_match:
+                    if context and context.tracing:
+                        context.record("Clause operator is %s, evaluate on "
+                                       "segment", clause.op)
+                    return self._check_target_in_segment(clause.values,
+                                                         target, context)
+                if target.get_attr_value(clause.attribute) is None:
+                    self.missing_attributes.record(
+                        clause.attribute, context.flag if context else None)
+                if context and context.tracing:
+                    context.record("Attribute type %s is none return false",
+                                   type)
                 return False
-            log.debug("evaluate clause with object %s "
-                      "operator %s and value %s",
-                      type, operator.upper(), clause.values)
-            if operator == IN_OPERATOR.lower():
-                return type.in_list(clause.values)
-            if operator == EQUAL_OPERATOR.lower():
-                return type.equal(clause.values)
-            if operator == GT_OPERATOR.lower():
-                return type.greater_than(clause.values)
-            if operator == STARTS_WITH_OPERATOR.lower():
-                return type.starts_with(clause.values)
-            if operator == ENDS_WITH_OPERATOR.lower():
-                return type.ends_with(clause.values)
-            if operator == CONTAINS_OPERATOR.lower():
-                return type.contains(clause.values)
-            if operator == EQUAL_SENSITIVE_OPERATOR.lower():
-                return type.equal_sensitive(clause.values)
+            if clause.predicate is None:
+                return False
+            if context and context.tracing:
+                context.record("evaluate clause with object %s "
+                               "operator %s and value %s",
+                               type, clause.op.upper(), clause.values)
+            return clause.predicate(type)
         except ValueError:
-            log.debug("couldn't convert %s to type %s", clause.values, type)
+            if context and context.tracing:
+                context.record("couldn't convert %s to type %s",
+                               clause.values, type)
         except Exception as e:
             log.warning("exception processing clause: "
                         "values: %s, type: %s, "
                         "error: %s", clause.values, type, e)
-        # unknown operation
         return False
 
-    def _evaluate_clauses(self, clauses: Union[Unset, Clauses],
-                          target: Target) -> bool:
-        if not isinstance(clauses, Unset):
-            for clause in clauses:
-                if self._evaluate_clause(clause, target):
-                    log.debug("Successful evaluation of clause %s", clause)
-                    return True
-        log.debug("All clauses %s evaluated", clauses)
+    def _evaluate_clauses(self, clauses: Sequence[CompiledClause],
+                          target: Target,
+                          context: Optional[EvaluationContext] = None) -> \
+            bool:
+        for clause in clauses:
+            if self._evaluate_clause(clause, target, context):
+                if context and context.tracing:
+                    context.record("Successful evaluation of clause on %s",
+                                   clause.attribute)
+                return True
+        if context and context.tracing:
+            context.record("All clauses evaluated")
         return False
 
-    def _evaluate_clauses_v2(self, clauses: List[Clause],
-                             target: Target) -> bool:
-        if not clauses or isinstance(clauses, Unset):
+    def _evaluate_clauses_v2(self, clauses: Sequence[CompiledClause],
+                             target: Target,
+                             context: Optional[EvaluationContext] = None) \
+            -> bool:
+        if not clauses:
             return False
 
         for clause in clauses:
-            if not self._evaluate_clause(clause, target):
+            if not self._evaluate_clause(clause, target, context):
                 # first false clause, short-circuit and exit with false
                 return False
         # all clauses have passed
         return True
 
-    def _evaluate_rule(self, rule: ServingRule, target: Target) -> bool:
-        return self._evaluate_clauses(rule.clauses, target)
+    def _evaluate_rule(self, rule: CompiledRule, target: Target,
+                       context: Optional[EvaluationContext] = None) -> bool:
+        return self._evaluate_clauses(rule.clauses, target, context)
 
-    def _evaluate_rules(self, rules: ServingRules,
-                        target: Target) -> Optional[str]:
+    def _evaluate_rules(self, rules: Sequence[CompiledRule], target: Target,
+                        context: Optional[EvaluationContext] = None) -> \
+            Optional[str]:
         if not rules or not target:
-            log.debug("There is no target or serving rule, %s, %s",
-                      rules, target)
+            if context and context.tracing:
+                context.record("There is no target or serving rule")
             return None
 
-        def sort_by_priority(item: ServingRule):
-            return item.priority
-
-        log.debug("Sorting serving rules %s", rules)
-        rules.sort(key=sort_by_priority)
-        log.debug("Sorted serving rules %s", rules)
-
+        # Rules are sorted by priority when the flag is stored
         identifier = None
         for rule in rules:
             # if evaluation is false just continue to next rule
-            if not self._evaluate_rule(rule, target):
-                log.debug(
-                    "Unsuccessful evaluation of rule %s continue to next rule",
-                    rule)
+            if not self._evaluate_rule(rule, target, context):
+                if context and context.tracing:
+                    context.record(
+                        "Unsuccessful evaluation of rule with priority %s "
+                        "continue to next rule", rule.priority)
                 continue
 
             # rule matched, check if there is distribution
             distribution = rule.serve.distribution
-            if not isinstance(distribution, Unset) and distribution:
-                log.debug("Evaluate distribution %s", distribution)
+            if distribution:
+                if context and context.tracing:
+                    context.record("Evaluate distribution bucket_by %s",
+                                   distribution.bucket_by)
                 identifier = self._evaluate_distribution(
-                    distribution, target)
+                    distribution, target, context)
 
             # rule matched, here must be variation if distribution is None
             variation = rule.serve.variation
-            if not isinstance(variation, Unset) and variation:
-                log.debug("Return rule variation identifier %s", identifier)
+            if variation:
+                if context and context.tracing:
+                    context.record("Return rule variation identifier %s",
+                                   identifier)
                 identifier = variation
 
-            log.debug("_evaluate_rules: matched, returning variation='%s'",
-                      identifier)
+            if context and context.tracing:
+                context.record("_evaluate_rules: matched, returning "
+                               "variation='%s'", identifier)
             return identifier
 
-        log.debug("All rules failed, return empty variation identifier")
+        if context and context.tracing:
+            context.record("All rules failed, return empty variation "
+                           "identifier")
         return None
 
-    def _evaluate_variation_map(self, var_target_map: List[VariationMap],
-                                target: Target) -> Optional[str]:
-        if not target or not var_target_map:
-            log.debug("Target is none")
+    def _evaluate_variation_map(
+            self, flag: CompiledFlag, target: Target,
+            context: Optional[EvaluationContext] = None) -> Optional[str]:
+        if not target:
+            if context and context.tracing:
+                context.record("Target is none")
             return None
 
-        # Only collect all target IDs if debug logging is enabled
-        if log.isEnabledFor(logging.DEBUG):
-            all_ids = [t.identifier for vm in var_target_map
-                       if not isinstance(vm.targets, Unset) and vm.targets
-                       for t in vm.targets
-                       if not isinstance(t, Unset) and
-                       hasattr(t, 'identifier')]
-            log.debug("_evaluate_variation_map: target='%s', "
-                      "all_targets_in_map=%s", target.identifier, all_ids)
-
-        for variation_map in var_target_map:
-            if not isinstance(variation_map.targets, Unset) and next(
-                    (val for val in variation_map.targets
-                     if not isinstance(val, Unset) and val.identifier ==
-                        target.identifier), None) is not None:
-                log.debug("MATCH FOUND: target='%s' in variation='%s'",
-                          target.identifier, variation_map.variation)
-                return variation_map.variation
+        # Individually targeted identifiers take precedence over segments
+        variation = flag.target_variations.get(target.identifier)
+        if variation:
+            if context and context.tracing:
+                context.record("MATCH FOUND: target='%s' in variation='%s'",
+                               target.identifier, variation)
+            return variation
 
-            segment_identifiers = variation_map.target_segments
-            if not isinstance(segment_identifiers, Unset) and \
-                    self._check_target_in_segment(segment_identifiers, target):
-                log.debug("MATCH FOUND: target='%s' in segment, "
-                          "variation='%s'",
-                          target.identifier, variation_map.variation)
+        for variation_map in flag.variation_to_target_map:
+            if self._check_target_in_segment(variation_map.target_segments,
+                                             target, context):
+                if context and context.tracing:
+                    context.record("MATCH FOUND: target='%s' in segment, "
+                                   "variation='%s'",
+                                   target.identifier, variation_map.variation)
                 return variation_map.variation
 
-        log.debug("NO MATCH: target='%s' not in variation map",
-                  target.identifier)
+        if context and context.tracing:
+            context.record("NO MATCH: target='%s' not in variation map",
+                           target.identifier)
         return None
 
-    def _evaluate_flag(self, fc: FeatureConfig,
-                       target: Target) -> Variation:
-        variation: Optional[str] = fc.off_variation
-        log.debug("feature %s state is %s", fc.feature, fc.state)
-        if fc.state == FeatureState.ON:
+    def _evaluate_flag(self, flag: CompiledFlag, target: Target,
+                       context: Optional[EvaluationContext] = None) -> \
+            Variation:
+        variation: Optional[str] = flag.off_variation
+        if context:
+            # Prerequisites are evaluated before, never during, their parent
+            context.flag = flag.feature
+        if context and context.tracing:
+            context.record("feature %s enabled is %s", flag.feature,
+                           flag.enabled)
+        if flag.enabled:
             variation = None
-            if not isinstance(fc.variation_to_target_map, Unset):
-                variation = self._evaluate_variation_map(
-                    fc.variation_to_target_map, target)
-                log.debug("variation %s found in target map", variation)
+            if flag.target_variations or flag.variation_to_target_map:
+                variation = self._evaluate_variation_map(flag, target,
+                                                         context)
+                if context and context.tracing:
+                    context.record("variation %s found in target map",
+                                   variation)
 
             if not variation:
-                variation = self._evaluate_rules(fc.rules, target)
-                log.debug("variation %s found in rules", variation)
+                variation = self._evaluate_rules(flag.rules, target,
+                                                 context)
+                if context and context.tracing:
+                    context.record("variation %s found in rules", variation)
 
-            if not variation and not isinstance(fc.default_serve.distribution,
-                                                Unset):
+            if not variation and flag.default_serve.distribution:
                 variation = self._evaluate_distribution(
-                    fc.default_serve.distribution, target)
-                log.debug(
-                    "variation %s found in default serve distribution",
-                    variation)
-
-            if not variation and not isinstance(fc.default_serve.variation,
-                                                Unset):
-                variation = fc.default_serve.variation
-                log.debug("variation %s found in default serve", variation)
-
-        return self._find_variation(fc.variations, variation)
-
-    def _check_prerequisite(self, parent: FeatureConfig,
-                            target: Target) -> bool:
-        if not isinstance(parent.prerequisites, Unset):
-            log.debug('Checking pre requisites %s of parent feature %s',
-                      parent.prerequisites, parent.feature)
-            for pqs in parent.prerequisites:
-                config = self.provider.get_flag(pqs.feature)
-                if not config:
-                    log.warning(
-                        'Could not retrieve the pre requisite details of ' +
-                        'feature flag: %s',
-                        parent.feature)
-                    return True
+                    flag.default_serve.distribution, target, context)
+                if context and context.tracing:
+                    context.record(
+                        "variation %s found in default serve distribution",
+                        variation)
+
+            if not variation and flag.default_serve.variation:
+                variation = flag.default_serve.variation
+                if context and context.tracing:
+                    context.record("variation %s found in default serve",
+                                   variation)
+
+        return self._find_variation(flag.variations, variation, context)
+
+    def _check_prerequisite(self, parent: CompiledFlag, target: Target,
+                            context: Optional[EvaluationContext] = None) -> \
+            bool:
+        if not parent.prerequisites:
+            return True
+        if context is None:
+            context = EvaluationContext()
+
+        # Each flag's prerequisites are checked once per context, so shared
+        # prerequisites of a diamond shaped graph are not evaluated again
+        memo = context.prerequisites.get(parent.feature)
+        if memo and memo[0] == parent.revision:
+            return memo[1]
+
+        if parent.feature in context.checking:
+            log.warning("Prerequisite cycle detected on feature flag %s, "
+                        "the prerequisite check fails", parent.feature)
+            return False
 
-                # Pre requisite variation value evaluated below
-                variation = self._evaluate_flag(config, target)
-                log.debug('Pre requisite flag %s has variation %s ' +
-                          'for target %s',
-                          config.feature, variation, target)
+        context.checking.add(parent.feature)
+        try:
+            result = self._check_prerequisites_of(parent, target, context)
+        finally:
+            context.checking.discard(parent.feature)
+        context.prerequisites[parent.feature] = (parent.revision, result)
+        return result
+
+    def _check_prerequisites_of(self, parent: CompiledFlag, target: Target,
+                                context: EvaluationContext) -> bool:
+        if context.tracing:
+            context.record('Checking pre requisites of parent feature %s',
+                           parent.feature)
+        for pqs in parent.prerequisites:
+            flag = self._get_compiled_flag(pqs.feature, context)
+            if not flag:
+                log.warning(
+                    'Could not retrieve the pre requisite details of ' +
+                    'feature flag: %s',
+                    parent.feature)
+                return True
+
+            # Pre requisite variation value evaluated below
+            variation = self._evaluate_flag_once(flag, target, context)
+            if context.tracing:
+                context.record('Pre requisite flag %s has variation %s ' +
+                               'for target %s',
+                               flag.feature, variation.identifier,
+                               target.identifier)
 
                 # Compare if the pre requisite variation is a possible
                 # valid value of the pre requisite FF
-                log.debug(
+                context.record(
                     'Pre requisite flag %s should have the variations %s',
-                    config.feature, pqs.variations)
-
-                if isinstance(variation, Unset) or variation.identifier \
-                        not in pqs.variations:
-                    return False
-                # Check for any nested prerequisites
-                if not self._check_prerequisite(config, target):
-                    return False
+                    flag.feature, pqs.variations)
+
+            if variation.identifier not in pqs.variations:
+                return False
+            # Check for any nested prerequisites
+            if not self._check_prerequisite(flag, target, context):
+                return False
         return True
 
-    def evaluate(self, identifier: str, target: Target,
-                 kind: str) -> Variation:
-        log.debug("evaluate: flag='%s', kind='%s', target='%s'",
-                  identifier, kind, target.identifier)
+    def _evaluate_flag_once(self, flag: CompiledFlag, target: Target,
+                            context: Optional[EvaluationContext] = None) -> \
+            Variation:
+        """_evaluate_flag memoized on the context, a flag that is both
+        evaluated and a prerequisite of another flag is evaluated once"""
+        if context is None:
+            return self._evaluate_flag(flag, target, context)
+        memo = context.variations.get(flag.feature)
+        if memo and memo[0] == flag.revision:
+            return memo[1]
+        variation = self._evaluate_flag(flag, target, context)
+        context.variations[flag.feature] = (flag.revision, variation)
+        return variation
 
-        fc = self.provider.get_flag(identifier)
-        if not fc:
-            log.debug("evaluate: flag '%s' not found", identifier)
+    def evaluate(self, identifier: str, target: Target, kind: str,
+                 context: Optional[EvaluationContext] = None) -> Variation:
+        """Evaluates a flag for the target. Callers evaluating several flags
+        for the same target can pass a shared EvaluationContext."""
+        if context is None:
+            context = self._new_context(target)
+            try:
+                return self._evaluate(identifier, target, kind, context)
+            finally:
+                self._complete_trace(context)
+        return self._evaluate(identifier, target, kind, context)
+
+    def _evaluate(self, identifier: str, target: Target, kind: str,
+                  context: EvaluationContext) -> Variation:
+        if context.tracing:
+            context.record("evaluate: flag='%s', kind='%s', target='%s'",
+                           identifier, kind, target.identifier)
+
+        flag, generation = self._get_flag_and_generation(identifier)
+        if not flag:
+            if context.tracing:
+                context.record("evaluate: flag '%s' not found", identifier)
             return Variation(identifier="", value=None)
 
-        # Log flag metadata only if debug enabled
-        if log.isEnabledFor(logging.DEBUG):
-            version = fc.version if not isinstance(fc.version, Unset) \
-                else 'Unset'
-            log.debug("evaluate: flag='%s', state=%s, kind=%s, version=%s",
-                      fc.feature, fc.state, fc.kind, version)
+        if context.tracing:
+            context.record("evaluate: flag='%s', enabled=%s, kind=%s, "
+                           "version=%s", flag.feature, flag.enabled,
+                           flag.kind, flag.version)
 
-        if fc.kind != kind:
+        if flag.kind != kind:
+            raise FlagKindMismatchException(
+                f"Requested {kind} variation on {flag.kind} flag")
+
+        return self._evaluate_compiled(flag, target, context, generation)
+
+    def evaluate_many(self, identifiers: Iterable[str], target: Target,
+                      context: Optional[EvaluationContext] = None) -> \
+            Dict[str, Tuple[FeatureConfigKind, Variation]]:
+        """Evaluates several flags for the same target, sharing segment,
+        attribute and bucket resolution between them. Flags that are not
+        found are left out of the result."""
+        if context is None:
+            context = self._new_context(target)
+            try:
+                return self._evaluate_many(identifiers, target, context)
+            finally:
+                self._complete_trace(context)
+        return self._evaluate_many(identifiers, target, context)
+
+    def _evaluate_many(self, identifiers: Iterable[str], target: Target,
+                       context: EvaluationContext) -> \
+            Dict[str, Tuple[FeatureConfigKind, Variation]]:
+        results: Dict[str, Tuple[FeatureConfigKind, Variation]] = {}
+        for identifier in identifiers:
+            flag, generation = self._get_flag_and_generation(identifier)
+            if not flag:
+                if context.tracing:
+                    context.record("evaluate_many: flag '%s' not found",
+                                   identifier)
+                continue
+            results[identifier] = (flag.kind, self._evaluate_compiled(
+                flag, target, context, generation))
+        return results
+
+    def evaluate_all(self, target: Target,
+                     context: Optional[EvaluationContext] = None) -> \
+            Dict[str, Tuple[FeatureConfigKind, Variation]]:
+        """Evaluates every flag in the repository for the target"""
+        return self.evaluate_many(self.provider.get_flag_identifiers(),
+                                  target, context)
+
+    def evaluate_targets(self, identifier: str, targets: Iterable[Target],
+                         kind: str) -> Iterator[Tuple[Target, Variation]]:
+        """Evaluates one flag for many targets, yielding each target with its
+        variation as the targets are consumed.
+
+        The flag, its prerequisites and the segments they reference are
+        looked up once, so every target in the batch is evaluated against
+        the same version of them. Results are not stored in the result
+        cache, a batch would only evict the entries of online traffic."""
+        flag = self.provider.get_compiled_flag(identifier)
+        if flag and flag.kind != kind:
             raise FlagKindMismatchException(
-                f"Requested {kind} variation on {fc.kind} flag")
+                f"Requested {kind} variation on {flag.kind} flag")
+        return self._evaluate_targets(identifier, flag, targets)
+
+    def _evaluate_targets(self, identifier: str, flag: Optional[CompiledFlag],
+                          targets: Iterable[Target]) -> \
+            Iterator[Tuple[Target, Variation]]:
+        if not flag:
+            log.debug("evaluate_targets: flag '%s' not found", identifier)
+            for target in targets:
+                yield target, Variation(identifier="", value=None)
+            return
+
+        flags, segments = self._resolve_dependencies(flag)
+        flags[flag.feature] = flag
+        for target in targets:
+            context = self._new_context(target, compiled_flags=flags,
+                                        compiled_segments=segments)
+            try:
+                variation = self._evaluate_with_prerequisites(flag, target,
+                                                              context)
+            finally:
+                self._complete_trace(context)
+            yield target, variation
+
+    def _get_flag_and_generation(self, identifier: str) -> \
+            Tuple[Optional[CompiledFlag], Optional[int]]:
+        """Looks up the flag and, when results are cached, its generation.
+        The generation is read first: a concurrent update can then only
+        leave a result stored under an outdated key, never an outdated
+        result under the current key."""
+        generation = None
+        if self.result_cache is not None:
+            generation = self.provider.get_flag_generation(identifier)
+        return self.provider.get_compiled_flag(identifier), generation
+
+    def _evaluate_compiled(
+            self, flag: CompiledFlag, target: Target,
+            context: Optional[EvaluationContext] = None,
+            generation: Optional[int] = None) -> Variation:
+        if context is None:
+            context = EvaluationContext()
+
+        # Traced evaluations bypass the result cache to record every step
+        if self.result_cache is None or generation is None or \
+                context.trace is not None:
+            return self._evaluate_with_prerequisites(flag, target, context)
+
+        key = self._result_key(flag, target, generation)
+        if key is None:
+            return self._evaluate_with_prerequisites(flag, target, context)
+
+        result = self.result_cache.get(key)
+        if result is not None:
+            if context.tracing:
+                context.record("evaluate: flag='%s', result='%s' from result "
+                               "cache", flag.feature, result.identifier)
+            return result
+
+        result = self._evaluate_with_prerequisites(flag, target, context)
+        self.result_cache.set(key, result)
+        return result
 
-        if fc.prerequisites:
-            prereq = self._check_prerequisite(fc, target)
+    def _evaluate_with_prerequisites(
+            self, flag: CompiledFlag, target: Target,
+            context: Optional[EvaluationContext] = None) -> Variation:
+        if flag.prerequisites:
+            prereq = self._check_prerequisite(flag, target, context)
             if not prereq:
-                return self._find_variation(fc.variations, fc.off_variation)
+                return self._find_variation(flag.variations,
+                                            flag.off_variation, context)
 
-        result = self._evaluate_flag(fc, target)
-        log.debug("evaluate: flag='%s', result='%s', value=%s",
-                  identifier, result.identifier, result.value)
+        result = self._evaluate_flag_once(flag, target, context)
+        if context and context.tracing:
+            context.record("evaluate: flag='%s', result='%s', value=%s",
+                           flag.feature, result.identifier, result.value)
         return result
+
+    def _result_key(self, flag: CompiledFlag, target: Target,
+                    generation: int) -> Optional[Hashable]:
+        attributes = None
+        if target.attributes:
+            try:
+                # Keep the value type, True and 1 evaluate differently
+                attributes = frozenset(
+                    (name, type(value), value)
+                    for name, value in target.attributes.items())
+            except TypeError:
+                # Unhashable attribute values, e.g. lists or dicts, are
+                # evaluated without the result cache
+                return None
+        return (flag.feature, target.identifier, target.name,
+                target.anonymous, attributes, generation)
+
+    def _resolve_dependencies(self, flag: CompiledFlag) -> \
+            Tuple[Dict[str, Optional[CompiledFlag]],
+                  Dict[str, Optional[CompiledSegment]]]:
+        """Looks up every prerequisite flag and segment the evaluation of the
+        flag depends on, mapping missing ones to None"""
+        flags: Dict[str, Optional[CompiledFlag]] = {}
+        pending_flags = [flag]
+        pending_segments = list(flag.segments)
+        while pending_flags:
+            current = pending_flags.pop()
+            for pqs in current.prerequisites:
+                if pqs.feature == flag.feature or pqs.feature in flags:
+                    continue
+                prereq = self.provider.get_compiled_flag(pqs.feature)
+                flags[pqs.feature] = prereq
+                if prereq:
+                    pending_flags.append(prereq)
+                    pending_segments.extend(prereq.segments)
+
+        segments: Dict[str, Optional[CompiledSegment]] = {}
+        while pending_segments:
+            identifier = pending_segments.pop()
+            if identifier in segments:
+                continue
+            segment = self.provider.get_compiled_segment(identifier)
+            segments[identifier] = segment
+            if segment:
+                pending_segments.extend(segment.segments)
+        return flags, segments
+
+    def _new_context(self, target: Target,
+                     **kwargs: Any) -> EvaluationContext:
+        trace = None
+        if target.identifier in self.trace_targets:
+            trace = EvaluationTrace(target=target.identifier)
+        return EvaluationContext(trace=trace, **kwargs)
+
+    def _complete_trace(self, context: EvaluationContext) -> None:
+        if context.trace is not None and context.trace.events:
+            try:
+                self.trace_handler(context.trace)
+            except Exception as e:
+                log.warning("Evaluation trace handler failed: %s", e)
+
+    def _get_compiled_flag(self, identifier: str,
+                           context: Optional[EvaluationContext]) -> \
+            Optional[CompiledFlag]:
+        if context and context.compiled_flags is not None and \
+                identifier in context.compiled_flags:
+            return context.compiled_flags[identifier]
+        return self.provider.get_compiled_flag(identifier)
+
+    def _get_compiled_segment(self, identifier: str,
+                              context: Optional[EvaluationContext]) -> \
+            Optional[CompiledSegment]:
+        if context and context.compiled_segments is not None and \
+                identifier in context.compiled_segments:
+            return context.compiled_segments[identifier]
+        return self.provider.get_compiled_segment(identifier)
@@ -0,0 +1,145 @@
+"""Parsed values of JSON flags.
+
+A JSON variation is parsed once, when its flag is compiled, into FrozenDict
+and FrozenList containers. Those are dict and list subclasses, so they
+compare, serialise and type check like the json.loads result, but cannot
+be modified: one instance is shared by every evaluation of the flag.
+
+Callers get a copy-on-write view by default. A view copies one level of
+the shared value when it is created, and a nested object or array only
+when it is read through the view, so the shared value is never modified
+and unread parts are never copied."""
+
+import copy
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+def _read_only(self: Any, *args: Any, **kwargs: Any) -> Any:
+    raise TypeError("JSON variation values are shared and cannot be "
+                    "modified, copy.deepcopy returns a modifiable copy")
+
+
+class FrozenDict(dict):
+    """A JSON object that cannot be modified"""
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return FrozenDict, (dict(self),)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, Any]:
+        return {key: copy.deepcopy(value, memo)
+                for key, value in self.items()}
+
+
+class FrozenList(list):
+    """A JSON array that cannot be modified"""
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = \
+        _read_only
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return FrozenList, (list(self),)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> List[Any]:
+        return [copy.deepcopy(value, memo) for value in self]
+
+
+def freeze(value: Any) -> Any:
+    """Converts the objects and arrays of a json.loads result to FrozenDict
+    and FrozenList"""
+    if type(value) is dict:
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if type(value) is list:
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def view(value: Any) -> Any:
+    """Returns a copy-on-write view of a frozen JSON value, or the value
+    itself if it is not an object or array"""
+    if type(value) is FrozenDict:
+        return JsonDict(value)
+    if type(value) is FrozenList:
+        return JsonList(value)
+    return value
+
+
+class JsonDict(dict):
+    """A modifiable JSON object whose nested objects and arrays are copied
+    from the shared value on first read. Copying the view with dict() or
+    dict.copy gives the shared, read-only nested values."""
+    __slots__ = ()
+
+    def _thaw(self, key: Any, value: Any) -> Any:
+        if type(value) is FrozenDict or type(value) is FrozenList:
+            value = view(value)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._thaw(key, dict.__getitem__(self, key))
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            return default
+        return self[key]
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            dict.__setitem__(self, key, default)
+        return self[key]
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        return view(dict.pop(self, key, *default))
+
+    def popitem(self) -> Tuple[Any, Any]:
+        key, value = dict.popitem(self)
+        return key, view(value)
+
+    def values(self) -> Any:
+        self._thaw_all()
+        return dict.values(self)
+
+    def items(self) -> Any:
+        self._thaw_all()
+        return dict.items(self)
+
+    def _thaw_all(self) -> None:
+        for key, value in dict.items(self):
+            if type(value) is FrozenDict or type(value) is FrozenList:
+                dict.__setitem__(self, key, view(value))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return dict, (dict(self.items()),)
+
+
+class JsonList(list):
+    """A modifiable JSON array whose nested objects and arrays are copied
+    from the shared value on first read"""
+    __slots__ = ()
+
+    def _thaw(self, index: int, value: Any) -> Any:
+        if type(value) is FrozenDict or type(value) is FrozenList:
+            value = view(value)
+            list.__setitem__(self, index, value)
+        return value
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._thaw(index, list.__getitem__(self, index))
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def pop(self, *index: Any) -> Any:
+        return view(list.pop(self, *index))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return list, (list(self),)
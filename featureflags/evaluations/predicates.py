@@ -0,0 +1,175 @@
+"""Clause predicates with their constant side folded at compile time.
+
+The ftypes operators convert, and for case insensitive operators lowercase,
+the clause values on every call. The predicates built here do that once when
+the clause is compiled and only touch the target value when evaluated.
+
+Each folder takes the clause values and returns a test on the raw attribute
+value held by one ftypes wrapper. If folding fails, for example when a
+clause value is not a valid number, that wrapper type falls back to the
+ftypes method so conversion errors surface exactly as before."""
+
+import operator
+import re
+from typing import Any, Callable, Dict, List
+
+from featureflags.ftypes import JSON, Boolean, Integer, Number, String
+from featureflags.ftypes.interface import Interface
+from featureflags.ftypes.utils import (get_bool_value, get_float_value,
+                                       get_int_value, get_str_value)
+from featureflags.util import log
+
+Test = Callable[[Any], bool]
+Folder = Callable[[List[Any]], Test]
+
+# Longest target value a match clause is run against. The re module cannot
+# be interrupted, so bounding the input bounds the time spent backtracking.
+MATCH_MAX_INPUT_LENGTH = 1024
+
+# A group made of a single character, class or escape repeated without
+# bound, itself repeated without bound, such as (a+)+ or (\w*)*, splits the
+# same input in exponentially many ways when it does not match. Groups with
+# anything else in them, such as (ab+)+ or (\d{3})+, are not ambiguous.
+_UNBOUNDED = r"(?:[*+]|\{\d*,\})"
+_ATOM = r"(?:\\.|\[\^?\]?(?:[^\]\\]|\\.)*\]|[^()|\\\[])"
+_NESTED_QUANTIFIER = re.compile(
+    r"\((?:\?:)?" + _ATOM + _UNBOUNDED + r"\??\)" + _UNBOUNDED)
+
+
+def _never(value: Any) -> bool:
+    return False
+
+
+def _fold_never(values: List[Any]) -> Test:
+    return _never
+
+
+def _fold_lower(compare: Callable[[str, str], bool]) -> Folder:
+    def fold(values: List[Any]) -> Test:
+        constant = get_str_value(values).lower()
+        return lambda value: compare(value.lower(), constant)
+    return fold
+
+
+def _fold_str(compare: Callable[[str, str], bool]) -> Folder:
+    def fold(values: List[Any]) -> Test:
+        constant = get_str_value(values)
+        return lambda value: compare(value, constant)
+    return fold
+
+
+def _fold_converted(convert: Callable[[List[Any]], Any],
+                    compare: Callable[[Any, Any], bool]) -> Folder:
+    def fold(values: List[Any]) -> Test:
+        constant = convert(values)
+        return lambda value: compare(value, constant)
+    return fold
+
+
+def _fold_in(values: List[Any]) -> Test:
+    # Raises TypeError for unhashable values, which keeps the list scan
+    members = frozenset(values)
+    return members.__contains__
+
+
+def _fold_match(values: List[Any]) -> Test:
+    source = get_str_value(values)
+    try:
+        pattern = re.compile(source)
+    except re.error as e:
+        log.warning("Invalid match clause pattern %s: %s", source, e)
+        return _never
+    if _NESTED_QUANTIFIER.search(source):
+        log.warning("Match clause pattern %s has nested quantifiers and "
+                    "will never match", source)
+        return _never
+
+    def test(value: str) -> bool:
+        if len(value) > MATCH_MAX_INPUT_LENGTH:
+            log.debug("Value is longer than %d characters, match clause "
+                      "pattern %s skipped", MATCH_MAX_INPUT_LENGTH, source)
+            return False
+        return pattern.match(value) is not None
+
+    return test
+
+
+_FOLDERS: Dict[str, Dict[type, Folder]] = {
+    "equal": {
+        String: _fold_lower(operator.eq),
+        Integer: _fold_converted(get_int_value, operator.eq),
+        Number: _fold_converted(get_float_value, operator.eq),
+        Boolean: _fold_converted(get_bool_value, operator.is_),
+        JSON: _fold_never,
+    },
+    "equal_sensitive": {
+        String: _fold_str(operator.eq),
+        Integer: _fold_never,
+        Number: _fold_never,
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+    "greater_than": {
+        String: _fold_lower(operator.gt),
+        Integer: _fold_converted(get_int_value, operator.gt),
+        Number: _fold_converted(get_float_value, operator.gt),
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+    "starts_with": {
+        String: _fold_str(str.startswith),
+        Integer: _fold_never,
+        Number: _fold_never,
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+    "ends_with": {
+        String: _fold_str(str.endswith),
+        Integer: _fold_never,
+        Number: _fold_never,
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+    "contains": {
+        String: _fold_str(operator.contains),
+        Integer: _fold_never,
+        Number: _fold_never,
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+    "match": {
+        String: _fold_match,
+        Integer: _fold_never,
+        Number: _fold_never,
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+    "in_list": {
+        String: _fold_in,
+        Integer: _fold_in,
+        Number: _fold_in,
+        Boolean: _fold_never,
+        JSON: _fold_never,
+    },
+}
+
+
+def compile_predicate(method: str,
+                      values: List[Any]) -> Callable[[Interface], bool]:
+    """Returns a predicate taking the typed target attribute that behaves
+    like calling ``method`` on it with ``values``."""
+    fallback = operator.methodcaller(method, values)
+    tests: Dict[type, Test] = {}
+    for klass, fold in _FOLDERS.get(method, {}).items():
+        try:
+            tests[klass] = fold(values)
+        except Exception:
+            pass
+
+    def predicate(operand: Interface) -> bool:
+        test = tests.get(type(operand))
+        if test is None:
+            return fallback(operand)
+        return test(operand.value)
+
+    return predicate
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional
+
+from featureflags.openapi.config.models.variation import Variation
+
+
+class ResultCache(object):
+    """Bounded LRU cache of evaluation results with an optional TTL.
+
+    Keys are built by the Evaluator from the flag, the target and the flag
+    generation, which the repository moves forward whenever the flag or a
+    flag or segment it depends on changes. Entries never need to be
+    invalidated explicitly: once an input changes the old entries are
+    simply no longer looked up and age out."""
+
+    def __init__(self, size: int = 10000,
+                 ttl: Optional[float] = None) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._lock = Lock()
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Variation]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,39 @@
+"""Structured per-evaluation tracing.
+
+The evaluator records its diagnostics through the EvaluationContext instead
+of calling log.debug directly. Whether anything is recorded is decided once,
+when the context is created, so with debug logging off a call site costs one
+attribute check and builds no arguments.
+
+Tracing can also be switched on for chosen targets only. The evaluations of
+those targets are recorded into an EvaluationTrace, whatever the log level,
+and handed to a trace handler once the evaluation completes."""
+
+from typing import Any, Callable, List, Tuple
+
+import attr
+
+from featureflags.util import log
+
+# A message with its %-style arguments, formatted only when read
+TraceEvent = Tuple[str, Tuple[Any, ...]]
+
+
+@attr.s(auto_attribs=True)
+class EvaluationTrace:
+    """Diagnostics recorded while evaluating flags for one target"""
+    target: str
+    events: List[TraceEvent] = attr.Factory(list)
+
+    def messages(self) -> List[str]:
+        return [message % args if args else message
+                for message, args in self.events]
+
+
+TraceHandler = Callable[[EvaluationTrace], None]
+
+
+def log_trace(trace: EvaluationTrace) -> None:
+    """Default trace handler, logs the whole trace as one INFO record"""
+    log.info("Evaluation trace for target '%s':\n  %s", trace.target,
+             "\n  ".join(trace.messages()))
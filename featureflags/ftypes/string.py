@@ -23,7 +23,7 @@ class String(Interface):
 
     def match(self, value: typing.Any) -> bool:
         _value = get_str_value(value)
-        return re.match(self.value, _value) is not None
+        return re.match(_value, self.value) is not None
 
     def contains(self, value: typing.Any) -> bool:
         _value = get_str_value(value)
@@ -19,6 +19,8 @@ class Cache(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def get(self, key: str) -> typing.Any:
+        """Returns the cached value, or None if the key is not cached.
+        Raising KeyError when the key is not cached is also supported."""
         raise NotImplementedError
 
     @abc.abstractmethod
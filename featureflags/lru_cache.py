@@ -1,30 +1,51 @@
 from collections import OrderedDict
-from typing import Any, List
+from typing import Any, List, Set
 from featureflags.util import log
 
 from .interface import Cache
 
+# Distinguishes a cached None from a key that is not cached
+_MISSING: Any = object()
+
 
 class LRUCache(Cache):
+    """Bounded cache evicting entries that have not been read recently.
+
+    Reads never reorder the cache, so a hit is a dict lookup plus, the first
+    time the entry is read since it was last considered for eviction, adding
+    its key to the referenced set. When the cache overflows the oldest entry
+    is evicted, unless it was referenced: then it is moved to the back with
+    the mark cleared and the next oldest is considered (CLOCK, or second
+    chance, eviction approximating LRU)."""
+
     def __init__(self, *args: Any, size: int = 2500, **kwargs: Any) -> None:
         self.size = size
         init = args
         if len(init) > 0:
             init = args[0][-size:]
         self.cache: OrderedDict = OrderedDict(init)
+        self._referenced: Set[str] = set()
 
     def __contains__(self, key: str) -> bool:
-        return self.get(key) is not None
+        return key in self.cache
 
     def __getitem__(self, key: str) -> Any:
-        return self.get(key)
+        val = self.get(key, _MISSING)
+        if val is _MISSING:
+            raise KeyError(key)
+        return val
 
     def __setitem__(self, key: str, value: Any) -> Any:
+        if key in self.cache:
+            self._referenced.add(key)
         self.cache[key] = value
-        self.cache.move_to_end(key)
 
         while len(self.cache) > self.size:
             oldkey = next(iter(self.cache))
+            if oldkey in self._referenced:
+                self._referenced.discard(oldkey)
+                self.cache.move_to_end(oldkey)
+                continue
             del self.cache[oldkey]
             log.warning("key evicted from cache: %s", oldkey)
 
@@ -34,15 +55,20 @@ class LRUCache(Cache):
     def set(self, key: str, value: Any) -> None:
         self.__setitem__(key, value)
 
-    def get(self, key: str) -> Any:
-        val = self.cache.get(key)
-        self.cache.move_to_end(key)
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns the cached value, or `default` if the key is not cached"""
+        val = self.cache.get(key, _MISSING)
+        if val is _MISSING:
+            return default
+        if key not in self._referenced:
+            self._referenced.add(key)
         return val
 
     def remove(self, keys: List[str]) -> None:
         for key in keys:
             if key in self.cache:
                 del self.cache[key]
+            self._referenced.discard(key)
 
     def keys(self) -> List[str]:
         return list(self.cache.keys())
@@ -1,14 +1,19 @@
+import asyncio
 import time
 from concurrent.futures import Future
 from threading import Event, Thread
-from typing import Dict
+from typing import Dict, List
 
+from featureflags.openapi.config.models.feature_config import FeatureConfig
+from featureflags.openapi.config.models.segment import Segment
 from featureflags.repository import DataProviderInterface
 
 from .config import Config
 from .openapi.config import AuthenticatedClient
 from .api import retryable_retrieve_feature_config, \
-    retryable_retrieve_segments, UnrecoverableRequestException
+    retryable_retrieve_segments, UnrecoverableRequestException, \
+    async_retryable_retrieve_feature_config, \
+    async_retryable_retrieve_segments
 from .sdk_logging_codes import (info_poll_ran_successfully, info_poll_started,
                                 info_polling_stopped, info_sdk_init_ok,
                                 warn_failed_init_fetch_error,
@@ -144,6 +149,11 @@ class PollingProcessor(Thread):
         flags_exception = flags_future.exception()
         segments_exception = segments_future.exception()
 
+        # Whatever was fetched is stored in one update of the repository
+        self.__repository.update(
+            flags=[] if flags_exception else flags_future.result(),
+            segments=[] if segments_exception else segments_future.result())
+
         if flags_exception:
             raise flags_exception
 
@@ -158,11 +168,7 @@ class PollingProcessor(Thread):
                 cluster=self.__cluster
             ).parsed
             log.debug("Feature flags loaded")
-            for flag in flags:
-                log.debug("Put flag %s into repository", flag.feature)
-                self.__repository.set_flag(flag)
-            future.set_result(
-                "Success")
+            future.set_result(flags)
 
         except UnrecoverableRequestException as e:
             warning_fetch_all_features_failed(e)
@@ -184,11 +190,7 @@ class PollingProcessor(Thread):
                 cluster=self.__cluster
             ).parsed
             log.debug("Target segments loaded")
-            for segment in segments:
-                log.debug("Put %s segment into repository", segment.identifier)
-                self.__repository.set_segment(segment)
-            future.set_result(
-                "Success")
+            future.set_result(segments)
 
         except UnrecoverableRequestException as e:
             warning_fetch_all_groups_failed(e)
@@ -200,3 +202,131 @@ class PollingProcessor(Thread):
             future.set_exception(
                 RetrievalError(
                     f"Failed to retrieve segments '{ex}'"))
+
+
+class AsyncPollingProcessor(object):
+    """PollingProcessor running as a task on the event loop, see
+    AsyncCfClient. Flags and segments are fetched concurrently with
+    coroutines instead of threads."""
+
+    def __init__(self, client: AuthenticatedClient, config: Config,
+                 environment_id: str,
+                 wait_for_initialization: asyncio.Event,
+                 initialised_failed_reason: Dict[bool, str],
+                 ready: asyncio.Event, stream_ready: asyncio.Event,
+                 repository: DataProviderInterface,
+                 cluster: str) -> None:
+        self._environment_id = environment_id
+        self._client = client
+        self._config = config
+        self._running = False
+        self._wait_for_initialization = wait_for_initialization
+        self._initialised_failed_reason = initialised_failed_reason
+        self._ready = ready
+        self._stream_ready = stream_ready
+        self._repository = repository
+        self._cluster = cluster
+
+    async def run(self) -> None:
+        if self._config.pull_interval < 60:
+            log.warning("Pull Interval must be greater than or equal to "
+                        "60 seconds, was: %s setting to 60",
+                        self._config.pull_interval)
+            self._config.pull_interval = 60
+
+        self._running = True
+        #  Get initial flags and groups
+        try:
+            log.info("Fetching initial target segments and flags")
+            await self.retrieve_flags_and_segments()
+            log.info("Initial target segments and flags fetched")
+            if not self._config.enable_stream:
+                info_poll_started(self._config.pull_interval)
+            info_sdk_init_ok()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            warn_failed_init_fetch_error(ex)
+            self._initialised_failed_reason[True] = str(ex)
+        # Unblock wait_for_initialization whether or not the fetch failed
+        self._wait_for_initialization.set()
+
+        if not self._config.enable_stream:
+            # Sleep for an interval before going into the polling loop,
+            # as we've just fetched flags/groups on init.
+            await asyncio.sleep(self._config.pull_interval)
+
+        while self._running:
+            start_time = time.time()
+            try:
+                if self._config.enable_stream and \
+                        self._stream_ready.is_set():
+                    #  Block until ready.set() is called
+                    await self._ready.wait()
+                    # on stream disconnect, make sure flags are in sync
+                    await self.retrieve_flags_and_segments()
+                    info_poll_ran_successfully()
+                    start_time = time.time()
+                else:
+                    await self.retrieve_flags_and_segments()
+                    info_poll_ran_successfully()
+                    self._ready.set()
+            except RetrievalError as ex:
+                log.error('Polling error: %s', ex)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception(
+                    'Error: Exception encountered when polling flags. %s', e)
+
+            elapsed = time.time() - start_time
+            if elapsed < self._config.pull_interval:
+                await asyncio.sleep(self._config.pull_interval - elapsed)
+
+    def stop(self) -> None:
+        self._running = False
+        info_polling_stopped("Client was closed")
+
+    async def retrieve_flags_and_segments(self) -> None:
+        flags, segments = await asyncio.gather(self._retrieve_flags(),
+                                               self._retrieve_segments(),
+                                               return_exceptions=True)
+        # Whatever was fetched is stored in one update of the repository
+        self._repository.update(
+            flags=[] if isinstance(flags, BaseException) else flags,
+            segments=[] if isinstance(segments, BaseException) else segments)
+        for result in (flags, segments):
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _retrieve_flags(self) -> List[FeatureConfig]:
+        try:
+            log.debug("Loading feature flags")
+            flags = (await async_retryable_retrieve_feature_config(
+                client=self._client, environment_uuid=self._environment_id,
+                cluster=self._cluster)).parsed
+            log.debug("Feature flags loaded")
+            return flags
+        except UnrecoverableRequestException as e:
+            warning_fetch_all_features_failed(e)
+            raise RetrievalError(f"Failed to retrieve flags '{e}'")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise RetrievalError(f"Failed to retrieve flags '{e}'")
+
+    async def _retrieve_segments(self) -> List[Segment]:
+        try:
+            log.debug("Loading target segments")
+            segments = (await async_retryable_retrieve_segments(
+                client=self._client, environment_uuid=self._environment_id,
+                cluster=self._cluster)).parsed
+            log.debug("Target segments loaded")
+            return segments
+        except UnrecoverableRequestException as e:
+            warning_fetch_all_groups_failed(e)
+            raise RetrievalError(f"Failed to retrieve segments '{e}'")
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            raise RetrievalError(f"Failed to retrieve segments '{ex}'")
@@ -1,7 +1,12 @@
 import abc
-from typing import List, Optional
-
-from featureflags.evaluations.constants import SEGMENT_MATCH_OPERATOR
+import itertools
+from threading import Lock
+from types import MappingProxyType
+from typing import (Any, Dict, FrozenSet, Iterable, List, Mapping, Optional,
+                    Set, Tuple, Union)
+
+from featureflags.evaluations.compiled import (CompiledFlag, CompiledSegment,
+                                               compile_flag, compile_segment)
 from featureflags.interface import Cache, Store
 from featureflags.openapi.config.models.feature_config import FeatureConfig
 from featureflags.openapi.config.models.segment import Segment
@@ -31,11 +36,33 @@ class QueryInterface(metaclass=abc.ABCMeta):
         """Get Target group from repository"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_compiled_flag(self, identifier: str) -> Optional[CompiledFlag]:
+        """Get the evaluation plan of a flag from repository"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_compiled_segment(self, identifier: str) -> \
+            Optional[CompiledSegment]:
+        """Get the evaluation plan of a Target group from repository"""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def find_flags_by_segment(self, identifier: str) -> List[str]:
         """Find all flags with rule segment match"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_flag_identifiers(self) -> List[str]:
+        """List the identifiers of all flags in the repository"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_flag_generation(self, identifier: str) -> int:
+        """Get a number that changes whenever the flag, or any flag or
+        segment its evaluation depends on, changes"""
+        raise NotImplementedError
+
 
 class DataProviderInterface(QueryInterface):
 
@@ -59,6 +86,15 @@ class DataProviderInterface(QueryInterface):
         """Put Target group to the repository"""
         raise NotImplementedError
 
+    def update(self, flags: Iterable[FeatureConfig] = (),
+               segments: Iterable[Segment] = ()) -> None:
+        """Put flags and Target groups to the repository, for example all
+        those fetched by one poll"""
+        for segment in segments:
+            self.set_segment(segment)
+        for flag in flags:
+            self.set_flag(flag)
+
     @abc.abstractmethod
     def remove_flag(self, identifier: str) -> None:
         """Remove Flag from the repository"""
@@ -74,6 +110,11 @@ class DataProviderInterface(QueryInterface):
         """Put Target group to the repository"""
         raise NotImplementedError
 
+    def snapshot(self) -> QueryInterface:
+        """Get a view of the repository that keeps returning the flags and
+        segments it first returned, whatever updates happen later"""
+        return RepositoryView(self)
+
 
 class Repository(DataProviderInterface):
 
@@ -81,65 +122,100 @@ class Repository(DataProviderInterface):
         self.cache = cache
         self.store = store
 
+        # Serializes updates, and snapshots with updates
+        self._lock = Lock()
+        self._index = DependencyIndex()
+
     def get_flag(self, identifier: str,
                  cacheable: bool = None, is_outdated_check=False) -> \
             Optional[FeatureConfig]:
+        flag = self.get_compiled_flag(identifier, cacheable,
+                                      is_outdated_check)
+        return flag.config if flag else None
+
+    def get_segment(self, identifier: str,
+                    cacheable: bool = None, is_outdated_check=False) -> \
+            Optional[Segment]:
+        segment = self.get_compiled_segment(identifier, cacheable,
+                                            is_outdated_check)
+        return segment.config if segment else None
+
+    def get_compiled_flag(self, identifier: str,
+                          cacheable: bool = None, is_outdated_check=False) \
+            -> Optional[CompiledFlag]:
         flag_key = format_flag_key(identifier)
-        try:
-            flag = self.cache.get(flag_key)
-            log.debug("get_flag: '%s' from cache", identifier)
+        flag = self._cached(flag_key)
+        if flag is not None:
+            return flag
+        if self.store:
+            fc = self.store.get(flag_key)
+            log.debug("get_flag: '%s' from store", identifier)
+            if not fc:
+                return None
+            # The store keeps the model, the plan only references it
+            flag = compile_flag(fc, encode=False)
+            if cacheable is not False:
+                log.debug("set flag to the cache %s", identifier)
+                self.cache.set(flag_key, flag)
             return flag
-        except KeyError:
-            if self.store:
-                flag = self.store.get(flag_key)
-                log.debug("get_flag: '%s' from store", identifier)
-                if flag and cacheable:
-                    log.debug("set flag to the cache %s", identifier)
-                    self.cache.set(flag_key, flag)
-                return flag
         # If we are checking if a flag is outdated, it might not be in the
         # cache to start with, so don't log a warning here
         if not is_outdated_check:
             log.warning("flag not found %s", identifier)
         return None
 
-    def get_segment(self, identifier: str,
-                    cacheable: bool = None, is_outdated_check=False) -> \
-            Optional[Segment]:
+    def get_compiled_segment(self, identifier: str,
+                             cacheable: bool = None,
+                             is_outdated_check=False) -> \
+            Optional[CompiledSegment]:
         segment_key = format_segment_key(identifier)
-        try:
-            segment = self.cache.get(segment_key)
-            log.debug("get_segment: '%s' from cache", identifier)
+        segment = self._cached(segment_key)
+        if segment is not None:
+            return segment
+        if self.store:
+            ts = self.store.get(segment_key)
+            log.debug("get_segment: '%s' from store", identifier)
+            if not ts:
+                return None
+            segment = compile_segment(ts, encode=False)
+            if cacheable is not False:
+                log.debug("set segment to the cache %s", identifier)
+                self.cache.set(segment_key, segment)
             return segment
-        except KeyError:
-            if self.store:
-                segment = self.store.get(segment_key)
-                log.debug("get_segment: '%s' from store", identifier)
-                if segment and cacheable:
-                    log.debug("set segment to the cache %s", identifier)
-                    self.cache.set(segment_key, segment)
-                return segment
         # If we are checking if a segment is outdated, it might not be in the
         # cache to start with, so don't log a warning here
         if not is_outdated_check:
             log.warning("segment not found %s", identifier)
         return None
 
+    def _cached(self, key: str) -> Any:
+        try:
+            return self.cache.get(key)
+        except KeyError:
+            # Caches may also follow the earlier contract of raising
+            # KeyError on a miss, see Cache.get
+            return None
+
     def set_flag(self, flag: FeatureConfig) -> None:
         if self.is_flag_outdated(flag.feature, flag):
             log.debug("set_flag: '%s' skipped (outdated)", flag.feature)
             return None
 
         flag_key = format_flag_key(flag.feature)
+        # With a store the plan is only indexed, it is compiled again when
+        # first read from the store
+        compiled = compile_flag(flag, encode=self.store is None)
 
-        if self.store:
-            self.store.set(flag_key, flag)
-            self.cache.remove([flag_key])
-            log.debug("set_flag: '%s' stored and cache invalidated",
-                      flag.feature)
-        else:
-            self.cache.set(flag_key, flag)
-            log.debug("set_flag: '%s' cached", flag.feature)
+        with self._lock:
+            if self.store:
+                self.store.set(flag_key, flag)
+                self.cache.remove([flag_key])
+                log.debug("set_flag: '%s' stored and cache invalidated",
+                          flag.feature)
+            else:
+                self.cache.set(flag_key, compiled)
+                log.debug("set_flag: '%s' cached", flag.feature)
+            self._index.set_flag(compiled)
 
     def set_segment(self, segment: Segment) -> None:
         if self.is_segment_outdated(segment.identifier, segment):
@@ -147,60 +223,83 @@ class Repository(DataProviderInterface):
                       segment.identifier)
             return None
 
-        # Sort the serving rules by priority
-        if segment.serving_rules is not Unset:
-            segment.serving_rules.sort(key=lambda rule: rule.priority)
-
         segment_key = format_segment_key(segment.identifier)
+        compiled = compile_segment(segment, encode=self.store is None)
 
-        if self.store:
-            self.store.set(segment_key, segment)
-            self.cache.remove([segment_key])
-            log.debug("set_segment: '%s' stored and cache invalidated",
-                      segment.identifier)
-        else:
-            self.cache.set(segment_key, segment)
-            log.debug("set_segment: '%s' cached", segment.identifier)
+        with self._lock:
+            if self.store:
+                self.store.set(segment_key, segment)
+                self.cache.remove([segment_key])
+                log.debug("set_segment: '%s' stored and cache invalidated",
+                          segment.identifier)
+            else:
+                self.cache.set(segment_key, compiled)
+                log.debug("set_segment: '%s' cached", segment.identifier)
+            self._index.set_segment(compiled)
 
     def find_flags_by_segment(self, segment: str) -> List[str]:
-        result = []
+        """Flags referencing the segment in a rule or a variation map"""
+        with self._lock:
+            return self._index.find_flags_by_segment(segment)
+
+    def get_flag_identifiers(self) -> List[str]:
         keys = self.cache.keys()
         if self.store:
             keys = self.store.keys()
-        for key in keys:
-            flag = self.get_flag(key, cacheable=False)
-            if not flag:
-                continue
-            for serving_rule in flag.rules:
-                for clause in serving_rule.clauses:
-                    if clause.op == SEGMENT_MATCH_OPERATOR and not next(
-                            (val for val in clause.values if val == segment),
-                            None
-                    ):
-                        log.debug("Flag %s evaluated in segments",
-                                  flag.feature)
-                        result.append(flag.feature)
-        return result
+        return [key[len(FLAG_KEY_PREFIX):] for key in keys
+                if key.startswith(FLAG_KEY_PREFIX)]
 
     def remove_flag(self, identifier: str) -> None:
         """Remove Flag from the repository"""
         flag_key = format_flag_key(identifier)
-        if self.store:
-            self.store.remove([flag_key])
-            log.debug("Flag %s successfully deleted from store", identifier)
+        with self._lock:
+            if self.store:
+                self.store.remove([flag_key])
+                log.debug("Flag %s successfully deleted from store",
+                          identifier)
 
-        self.cache.remove([flag_key])
-        log.debug("Flag %s successfully deleted from cache", identifier)
+            self.cache.remove([flag_key])
+            log.debug("Flag %s successfully deleted from cache", identifier)
+            self._index.remove_flag(identifier)
 
     def remove_segment(self, identifier: str) -> None:
         """Remove Target group from the repository"""
         segment_key = format_segment_key(identifier)
-        if self.store:
-            self.store.remove([segment_key])
-            log.debug("Segment %s successfully deleted from store", identifier)
+        with self._lock:
+            if self.store:
+                self.store.remove([segment_key])
+                log.debug("Segment %s successfully deleted from store",
+                          identifier)
 
-        self.cache.remove([segment_key])
-        log.debug("Segment %s successfully deleted from cache", identifier)
+            self.cache.remove([segment_key])
+            log.debug("Segment %s successfully deleted from cache",
+                      identifier)
+            self._index.remove_segment(identifier)
+
+    def get_flag_generation(self, identifier: str) -> int:
+        return self._index.get_flag_generation(identifier)
+
+    def snapshot(self) -> "RepositorySnapshot":
+        """Get a copy of every flag and segment with their generations, taken
+        while no update is in progress. Reads each flag and segment from the
+        cache or store, SnapshotRepository takes snapshots for free."""
+        flags: Dict[str, CompiledFlag] = {}
+        segments: Dict[str, CompiledSegment] = {}
+        with self._lock:
+            keys = self.store.keys() if self.store else self.cache.keys()
+            for key in keys:
+                if key.startswith(FLAG_KEY_PREFIX):
+                    flag = self.get_compiled_flag(
+                        key[len(FLAG_KEY_PREFIX):], is_outdated_check=True)
+                    if flag is not None:
+                        flags[flag.feature] = flag
+                elif key.startswith(SEGMENT_KEY_PREFIX):
+                    segment = self.get_compiled_segment(
+                        key[len(SEGMENT_KEY_PREFIX):], is_outdated_check=True)
+                    if segment is not None:
+                        segments[segment.identifier] = segment
+            return RepositorySnapshot(flags, segments,
+                                      dict(self._index.generations))
 
     def close(self) -> None:
         if self.store:
@@ -208,28 +307,255 @@ class Repository(DataProviderInterface):
 
     def is_flag_outdated(self, identifier: str,
                          new_config: FeatureConfig) -> bool:
-        flag = self.get_flag(identifier, cacheable=False,
-                             is_outdated_check=True)
-        if flag and not isinstance(flag.version, Unset) and \
-                not isinstance(new_config, Unset) and \
-                not isinstance(new_config.version, Unset):
-            return flag.version >= new_config.version
-        return False
+        if isinstance(new_config, Unset):
+            return False
+        return _is_outdated(self._stored_version(format_flag_key(identifier)),
+                            new_config.version)
 
     def is_segment_outdated(self, identifier: str,
                             new_segment: Segment) -> bool:
-        segment = self.get_segment(identifier, cacheable=False,
-                                   is_outdated_check=True)
-        if segment and not isinstance(segment.version, Unset) and \
-                not isinstance(new_segment, Unset) and \
-                not isinstance(new_segment.version, Unset):
-            return segment.version >= new_segment.version
-        return False
+        if isinstance(new_segment, Unset):
+            return False
+        return _is_outdated(
+            self._stored_version(format_segment_key(identifier)),
+            new_segment.version)
+
+    def _stored_version(self, key: str) -> Optional[int]:
+        """Version of the cached plan, or else of the stored model, which is
+        not compiled just to read it"""
+        cached = self._cached(key)
+        if cached is not None:
+            return cached.version
+        if self.store:
+            model = self.store.get(key)
+            if model and not isinstance(model.version, Unset):
+                return model.version
+        return None
+
+
+def _is_outdated(version: Optional[int],
+                 new_version: Union[Unset, int]) -> bool:
+    return version is not None and not isinstance(new_version, Unset) and \
+        version >= new_version
+
+
+class RepositoryView(QueryInterface):
+    """Pins the flags, segments and generations of a repository as they are
+    first looked up. Later lookups through the view return the same objects,
+    so evaluations made through one view never mix versions of a flag or
+    segment. Objects not looked up yet are read when first needed, use a
+    RepositorySnapshot for a view of the whole repository at one instant."""
+
+    def __init__(self, provider: QueryInterface) -> None:
+        self._provider = provider
+        self._flags: Dict[str, Optional[CompiledFlag]] = {}
+        self._segments: Dict[str, Optional[CompiledSegment]] = {}
+        self._generations: Dict[str, int] = {}
+        self._flag_identifiers: Optional[List[str]] = None
+
+    def get_flag(self, identifier: str) -> Optional[FeatureConfig]:
+        flag = self.get_compiled_flag(identifier)
+        return flag.config if flag else None
+
+    def get_segment(self, identifier: str) -> Optional[Segment]:
+        segment = self.get_compiled_segment(identifier)
+        return segment.config if segment else None
+
+    def get_compiled_flag(self, identifier: str) -> Optional[CompiledFlag]:
+        if identifier not in self._flags:
+            # setdefault keeps the first object pinned by concurrent readers
+            self._flags.setdefault(
+                identifier, self._provider.get_compiled_flag(identifier))
+        return self._flags[identifier]
+
+    def get_compiled_segment(self, identifier: str) -> \
+            Optional[CompiledSegment]:
+        if identifier not in self._segments:
+            self._segments.setdefault(
+                identifier, self._provider.get_compiled_segment(identifier))
+        return self._segments[identifier]
+
+    def find_flags_by_segment(self, identifier: str) -> List[str]:
+        return self._provider.find_flags_by_segment(identifier)
+
+    def get_flag_identifiers(self) -> List[str]:
+        if self._flag_identifiers is None:
+            self._flag_identifiers = self._provider.get_flag_identifiers()
+        return list(self._flag_identifiers)
+
+    def get_flag_generation(self, identifier: str) -> int:
+        if identifier not in self._generations:
+            self._generations.setdefault(
+                identifier, self._provider.get_flag_generation(identifier))
+        return self._generations[identifier]
+
+
+class RepositorySnapshot(QueryInterface):
+    """Immutable point-in-time view of the flags and segments of a
+    repository. Lookups are plain dict reads and a snapshot can be shared
+    between threads."""
+
+    def __init__(self, flags: Optional[Dict[str, CompiledFlag]] = None,
+                 segments: Optional[Dict[str, CompiledSegment]] = None,
+                 generations: Optional[Dict[str, int]] = None) -> None:
+        self._flags: Dict[str, CompiledFlag] = flags or {}
+        self._segments: Dict[str, CompiledSegment] = segments or {}
+        self._generations: Dict[str, int] = generations or {}
+
+    @property
+    def flags(self) -> Mapping[str, CompiledFlag]:
+        return MappingProxyType(self._flags)
+
+    @property
+    def segments(self) -> Mapping[str, CompiledSegment]:
+        return MappingProxyType(self._segments)
+
+    def get_flag(self, identifier: str) -> Optional[FeatureConfig]:
+        flag = self.get_compiled_flag(identifier)
+        return flag.config if flag else None
+
+    def get_segment(self, identifier: str) -> Optional[Segment]:
+        segment = self.get_compiled_segment(identifier)
+        return segment.config if segment else None
+
+    def get_compiled_flag(self, identifier: str) -> Optional[CompiledFlag]:
+        flag = self._flags.get(identifier)
+        if flag is None:
+            log.warning("flag not found %s", identifier)
+        return flag
+
+    def get_compiled_segment(self, identifier: str) -> \
+            Optional[CompiledSegment]:
+        segment = self._segments.get(identifier)
+        if segment is None:
+            log.warning("segment not found %s", identifier)
+        return segment
+
+    def find_flags_by_segment(self, identifier: str) -> List[str]:
+        return sorted(flag.feature for flag in self._flags.values()
+                      if identifier in flag.segments)
+
+    def get_flag_identifiers(self) -> List[str]:
+        return list(self._flags)
+
+    def get_flag_generation(self, identifier: str) -> int:
+        return self._generations.get(identifier, 0)
+
+
+class DependencyIndex(object):
+    """Reverse dependency index of the flags and segments of a repository.
+
+    Maps each segment to the flags and segments referencing it, and each
+    flag to the flags having it as a prerequisite, so that the flags
+    affected by a change are found without scanning. Every change moves the
+    affected flags to a new generation. The index is not thread safe,
+    callers serialize updates."""
+
+    def __init__(self) -> None:
+        self._segment_flags: Dict[str, Set[str]] = {}
+        self._segment_segments: Dict[str, Set[str]] = {}
+        self._flag_dependents: Dict[str, Set[str]] = {}
+        # Forward edges of each flag and segment, to unlink them on change
+        self._flag_edges: Dict[str, Tuple[FrozenSet[str],
+                                          FrozenSet[str]]] = {}
+        self._segment_edges: Dict[str, FrozenSet[str]] = {}
+        self.generations: Dict[str, int] = {}
+        self._generation_counter = itertools.count(1)
+
+    def set_flag(self, flag: CompiledFlag) -> None:
+        self._link_flag(flag.feature, flag.segments, frozenset(
+            pqs.feature for pqs in flag.prerequisites))
+        self._invalidate([flag.feature], [])
+
+    def remove_flag(self, identifier: str) -> None:
+        self._link_flag(identifier, frozenset(), frozenset())
+        self._invalidate([identifier], [])
+
+    def set_segment(self, segment: CompiledSegment) -> None:
+        self._link_segment(segment.identifier, segment.segments)
+        self._invalidate([], [segment.identifier])
+
+    def remove_segment(self, identifier: str) -> None:
+        self._link_segment(identifier, frozenset())
+        self._invalidate([], [identifier])
+
+    def find_flags_by_segment(self, segment: str) -> List[str]:
+        return sorted(self._segment_flags.get(segment, ()))
+
+    def get_flag_generation(self, identifier: str) -> int:
+        return self.generations.get(identifier, 0)
+
+    def _link_flag(self, identifier: str, segments: FrozenSet[str],
+                   prerequisites: FrozenSet[str]) -> None:
+        old_segments, old_prerequisites = self._flag_edges.pop(
+            identifier, (frozenset(), frozenset()))
+        _unlink(self._segment_flags, old_segments - segments, identifier)
+        _unlink(self._flag_dependents, old_prerequisites - prerequisites,
+                identifier)
+        for segment in segments:
+            self._segment_flags.setdefault(segment, set()).add(identifier)
+        for prerequisite in prerequisites:
+            self._flag_dependents.setdefault(prerequisite,
+                                             set()).add(identifier)
+        if segments or prerequisites:
+            self._flag_edges[identifier] = (segments, prerequisites)
+
+    def _link_segment(self, identifier: str,
+                      segments: FrozenSet[str]) -> None:
+        old_segments = self._segment_edges.pop(identifier, frozenset())
+        _unlink(self._segment_segments, old_segments - segments, identifier)
+        for segment in segments:
+            self._segment_segments.setdefault(segment, set()).add(identifier)
+        if segments:
+            self._segment_edges[identifier] = segments
+
+    def _invalidate(self, flags: Iterable[str],
+                    segments: Iterable[str]) -> None:
+        """Moves the given flags, the flags referencing the given segments
+        and, transitively, every flag depending on them to a new generation.
+        Called after the change is written so that results computed from
+        the old data are never stored under the new generation."""
+        affected = set(flags)
+        seen_segments: Set[str] = set()
+        pending_segments = list(segments)
+        while pending_segments:
+            segment = pending_segments.pop()
+            if segment in seen_segments:
+                continue
+            seen_segments.add(segment)
+            affected.update(self._segment_flags.get(segment, ()))
+            pending_segments.extend(self._segment_segments.get(segment, ()))
+
+        pending_flags = list(affected)
+        while pending_flags:
+            flag = pending_flags.pop()
+            for dependent in self._flag_dependents.get(flag, ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    pending_flags.append(dependent)
+
+        for flag in affected:
+            self.generations[flag] = next(self._generation_counter)
+
+
+def _unlink(index: Dict[str, Set[str]], keys: Iterable[str],
+            identifier: str) -> None:
+    for key in keys:
+        dependents = index.get(key)
+        if dependents is None:
+            continue
+        dependents.discard(identifier)
+        if not dependents:
+            del index[key]
+
+
+FLAG_KEY_PREFIX = 'flags/'
+SEGMENT_KEY_PREFIX = 'segments/'
 
 
 def format_flag_key(identifier: str) -> str:
-    return f'flags/{identifier}'
+    return f'{FLAG_KEY_PREFIX}{identifier}'
 
 
 def format_segment_key(identifier: str) -> str:
-    return f'segments/{identifier}'
+    return f'{SEGMENT_KEY_PREFIX}{identifier}'
@@ -0,0 +1,156 @@
+"""Copy-on-write repository whose readers never lock or mutate shared state.
+
+All flags and segments are held by an immutable RepositorySnapshot. Writers
+build the next snapshot from the current one and publish it with a single
+reference assignment, which is atomic, so readers always see either the old
+or the new snapshot and never a half applied update."""
+
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, TypeVar, Union
+
+from featureflags.evaluations.compiled import (CompiledFlag, CompiledSegment,
+                                               compile_flag, compile_segment)
+from featureflags.openapi.config.models.feature_config import FeatureConfig
+from featureflags.openapi.config.models.segment import Segment
+from featureflags.openapi.config.types import Unset
+from featureflags.repository import (DataProviderInterface, DependencyIndex,
+                                     RepositorySnapshot)
+from featureflags.util import approximate_size, log
+
+V = TypeVar("V")
+
+
+class SnapshotRepository(DataProviderInterface):
+    """In memory repository publishing a new RepositorySnapshot on every
+    update. Reads go to the current snapshot without locking, updates are
+    serialized and copy the flag or segment mapping they change."""
+
+    def __init__(self) -> None:
+        self._snapshot = RepositorySnapshot()
+        self._lock = Lock()
+        self._index = DependencyIndex()
+
+    def snapshot(self) -> RepositorySnapshot:
+        """Get the current snapshot, later updates do not affect it"""
+        return self._snapshot
+
+    def get_flag(self, identifier: str) -> Optional[FeatureConfig]:
+        return self._snapshot.get_flag(identifier)
+
+    def get_segment(self, identifier: str) -> Optional[Segment]:
+        return self._snapshot.get_segment(identifier)
+
+    def get_compiled_flag(self, identifier: str) -> Optional[CompiledFlag]:
+        return self._snapshot.get_compiled_flag(identifier)
+
+    def get_compiled_segment(self, identifier: str) -> \
+            Optional[CompiledSegment]:
+        return self._snapshot.get_compiled_segment(identifier)
+
+    def find_flags_by_segment(self, identifier: str) -> List[str]:
+        with self._lock:
+            return self._index.find_flags_by_segment(identifier)
+
+    def get_flag_identifiers(self) -> List[str]:
+        return self._snapshot.get_flag_identifiers()
+
+    def get_flag_generation(self, identifier: str) -> int:
+        return self._snapshot.get_flag_generation(identifier)
+
+    def set_flag(self, flag: FeatureConfig) -> None:
+        self.update(flags=[flag])
+
+    def set_segment(self, segment: Segment) -> None:
+        self.update(segments=[segment])
+
+    def update(self, flags: Iterable[FeatureConfig] = (),
+               segments: Iterable[Segment] = ()) -> None:
+        """Compiles the flags and segments newer than those of the current
+        snapshot and publishes them in a single new snapshot"""
+        with self._lock:
+            current = self._snapshot
+            changed_flags: Dict[str, CompiledFlag] = {}
+            for flag in flags:
+                if _is_outdated(changed_flags.get(flag.feature) or
+                                current._flags.get(flag.feature),
+                                flag.version):
+                    log.debug("set_flag: '%s' skipped (outdated)",
+                              flag.feature)
+                    continue
+                compiled = compile_flag(flag)
+                changed_flags[compiled.feature] = compiled
+                self._index.set_flag(compiled)
+
+            changed_segments: Dict[str, CompiledSegment] = {}
+            for segment in segments:
+                if _is_outdated(changed_segments.get(segment.identifier) or
+                                current._segments.get(segment.identifier),
+                                segment.version):
+                    log.debug("set_segment: '%s' skipped (outdated)",
+                              segment.identifier)
+                    continue
+                compiled = compile_segment(segment)
+                changed_segments[compiled.identifier] = compiled
+                self._index.set_segment(compiled)
+
+            if not changed_flags and not changed_segments:
+                return
+            self._publish(_merged(current._flags, changed_flags),
+                          _merged(current._segments, changed_segments))
+        log.debug("update: %d flags and %d segments cached",
+                  len(changed_flags), len(changed_segments))
+
+    def remove_flag(self, identifier: str) -> None:
+        with self._lock:
+            current = self._snapshot
+            flags = dict(current._flags)
+            flags.pop(identifier, None)
+            self._index.remove_flag(identifier)
+            self._publish(flags, current._segments)
+        log.debug("Flag %s successfully deleted from cache", identifier)
+
+    def remove_segment(self, identifier: str) -> None:
+        with self._lock:
+            current = self._snapshot
+            segments = dict(current._segments)
+            segments.pop(identifier, None)
+            self._index.remove_segment(identifier)
+            self._publish(current._flags, segments)
+        log.debug("Segment %s successfully deleted from cache", identifier)
+
+    def close(self) -> None:
+        pass
+
+    def memory_usage(self) -> int:
+        """Approximate number of bytes used by the current snapshot"""
+        snapshot = self._snapshot
+        return approximate_size((snapshot._flags, snapshot._segments))
+
+    def is_flag_outdated(self, identifier: str,
+                         new_config: FeatureConfig) -> bool:
+        return _is_outdated(self._snapshot.flags.get(identifier),
+                            new_config.version)
+
+    def is_segment_outdated(self, identifier: str,
+                            new_segment: Segment) -> bool:
+        return _is_outdated(self._snapshot.segments.get(identifier),
+                            new_segment.version)
+
+    def _publish(self, flags: Dict[str, CompiledFlag],
+                 segments: Dict[str, CompiledSegment]) -> None:
+        self._snapshot = RepositorySnapshot(flags, segments,
+                                            dict(self._index.generations))
+
+
+def _is_outdated(current: Optional[Union[CompiledFlag, CompiledSegment]],
+                 version: Union[Unset, int]) -> bool:
+    return current is not None and current.version is not None and \
+        not isinstance(version, Unset) and current.version >= version
+
+
+def _merged(mapping: Dict[str, V], changes: Dict[str, V]) -> Dict[str, V]:
+    if not changes:
+        return mapping
+    merged = dict(mapping)
+    merged.update(changes)
+    return merged
@@ -1,9 +1,10 @@
+import asyncio
 import random
 import threading
 import time
 import traceback
 from threading import Thread
-from typing import Union
+from typing import AsyncIterator, Set, Union
 
 from featureflags.repository import DataProviderInterface
 
@@ -13,7 +14,10 @@ from .openapi.config import AuthenticatedClient
 
 from .api import \
     retryable_retrieve_feature_config_by_identifier, \
-    retryable_retrieve_segment_by_identifier, UnrecoverableRequestException
+    retryable_retrieve_segment_by_identifier, UnrecoverableRequestException, \
+    async_retryable_retrieve_feature_config_by_identifier, \
+    async_retryable_retrieve_segment_by_identifier
+from .openapi.config.api.client import stream as stream_api
 from .sdk_logging_codes import (info_poll_started, info_polling_stopped,
                                 info_stream_connected,
                                 info_stream_event_received,
@@ -22,7 +26,7 @@ from .sdk_logging_codes import (info_poll_started, info_polling_stopped,
                                 warn_stream_retrying_long_duration,
                                 warning_fetch_feature_by_id_failed,
                                 warning_fetch_group_by_id_failed)
-from .sse_client import SSEClient
+from .sse_client import Event, SSEClient, end_of_field
 from .util import log
 
 BACK_OFF_IN_SECONDS = 5
@@ -227,3 +231,145 @@ class SegmentMsgProcessor(Thread):
             self._repository.remove_segment(self._msg.identifier)
             log.debug('flag %s successfully removed from cache',
                       self._msg.identifier)
+
+
+class AsyncStreamProcessor(object):
+    """StreamProcessor running as a task on the event loop, see
+    AsyncCfClient. Flags and segments named by stream events are fetched by
+    tasks rather than a thread per event."""
+
+    def __init__(self, repository: DataProviderInterface,
+                 client: AuthenticatedClient,
+                 environment_id: str, api_key: str,
+                 config: Config,
+                 ready: asyncio.Event,
+                 poller: asyncio.Event,
+                 cluster: str):
+        self._running = False
+        self._ready = ready
+        self.poller = poller
+        self._client = client
+        self._environment_id = environment_id
+        self._api_key = api_key
+        self._repository = repository
+        self._poll_interval = config.pull_interval
+        self._disconnect_notified = False
+        self._cluster = cluster
+        self._stream_url = f'{config.base_url}/stream?cluster={cluster}'
+        self._retries = 0
+        # Fetches started by stream events, cancelled on stop
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        log.info("Starting StreamingProcessor connecting to uri: %s",
+                 self._stream_url)
+        self._running = True
+        while self._running:
+            try:
+                async for event in self._events():
+                    if not self._running:
+                        break
+                    if event.data:
+                        info_stream_event_received(event.data)
+                        self.process_message(Message.from_str(event.data))
+                    if not self._ready.is_set():
+                        self._ready.set()
+                if self._running:
+                    raise EOFError("Stream closed by the server")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._disconnect_notified:
+                    warn_stream_disconnected(e)
+                    info_poll_started(self._poll_interval)
+                    self._disconnect_notified = True
+                else:
+                    log.warning("Stream retry failed: %s", str(e))
+
+                self._ready.clear()
+                # Signal the poller than it should start due to stream error.
+                self.poller.set()
+
+                if self._retries >= 4:
+                    warn_stream_retrying_long_duration()
+                sleep = (BACK_OFF_IN_SECONDS * 2 ** self._retries +
+                         random.uniform(0, 1))
+                warn_stream_retrying(f'{sleep.__str__()}s')
+                await asyncio.sleep(sleep)
+                self._retries += 1
+
+    async def _events(self) -> AsyncIterator[Event]:
+        # The generated stream request reads the whole response, only its
+        # request arguments are used to read the events as they arrive
+        kwargs = stream_api._get_kwargs(cluster=self._cluster,
+                                        api_key=self._api_key)
+        kwargs["headers"]["Cache-Control"] = "no-cache"
+        kwargs["headers"]["Accept"] = "text/event-stream"
+        httpx_client = self._client.get_async_httpx_client()
+        # No heartbeat from the server in 60 seconds means the socket died
+        async with httpx_client.stream(**kwargs, timeout=60) as response:
+            response.raise_for_status()
+            info_stream_connected()
+            self._disconnect_notified = False
+            info_polling_stopped('streaming mode is active')
+            self.poller.clear()
+            self._ready.set()
+            self._retries = 0
+            buffer = ""
+            async for text in response.aiter_text():
+                buffer += text
+                while True:
+                    parts = end_of_field.split(buffer, maxsplit=1)
+                    if len(parts) == 1:
+                        break
+                    raw, buffer = parts
+                    yield Event.parse(raw)
+
+    def process_message(self, msg: Message) -> None:
+        if msg.domain == "flag":
+            coroutine = self._process_flag(msg)
+        elif msg.domain == "target-segment":
+            coroutine = self._process_segment(msg)
+        else:
+            return
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_flag(self, msg: Message) -> None:
+        if msg.event == 'create' or msg.event == 'patch':
+            try:
+                fc = (await
+                      async_retryable_retrieve_feature_config_by_identifier(
+                          client=self._client, identifier=msg.identifier,
+                          environment_uuid=self._environment_id,
+                          cluster=self._cluster)).parsed
+                if fc is not None:
+                    self._repository.set_flag(fc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                warning_fetch_feature_by_id_failed(ex)
+        elif msg.event == 'delete':
+            self._repository.remove_flag(msg.identifier)
+
+    async def _process_segment(self, msg: Message) -> None:
+        if msg.event == 'create' or msg.event == 'patch':
+            try:
+                ts = (await async_retryable_retrieve_segment_by_identifier(
+                    client=self._client, identifier=msg.identifier,
+                    environment_uuid=self._environment_id,
+                    cluster=self._cluster)).parsed
+                self._repository.set_segment(ts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                warning_fetch_group_by_id_failed(ex)
+        elif msg.event == 'delete':
+            self._repository.remove_segment(msg.identifier)
+
+    def stop(self) -> None:
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        info_stream_stopped()
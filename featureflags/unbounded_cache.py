@@ -0,0 +1,44 @@
+from typing import Any, Dict, List
+
+from .interface import Cache
+from .util import approximate_size
+
+
+class UnboundedCache(Cache):
+    """Cache holding every flag and segment of the environment without
+    eviction. A flag evicted from a bounded cache is not fetched again until
+    the next poll or stream event and evaluates to the default meanwhile, so
+    configuration must not be evicted. Use memory_usage to check the cost."""
+
+    def __init__(self) -> None:
+        self.cache: Dict[str, Any] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.cache
+
+    def __getitem__(self, key: str) -> Any:
+        return self.cache[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.cache[key] = value
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def set(self, key: str, value: Any) -> None:
+        self.cache[key] = value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns the cached value, or `default` if the key is not cached"""
+        return self.cache.get(key, default)
+
+    def remove(self, keys: List[str]) -> None:
+        for key in keys:
+            self.cache.pop(key, None)
+
+    def keys(self) -> List[str]:
+        return list(self.cache.keys())
+
+    def memory_usage(self) -> int:
+        """Approximate number of bytes used by the cached entries"""
+        return approximate_size(dict(self.cache))
@@ -1,6 +1,71 @@
+import functools
 import logging
 import sys
+import types
+from typing import Any, Set
 
 log = logging.getLogger(sys.modules[__name__].__name__)
 log.addHandler(logging.StreamHandler())
 log.setLevel(logging.WARNING)
+
+
+def intern_str(value: Any) -> Any:
+    """Returns the interned copy of a string and any other value unchanged.
+    Only for the names configuration repeats: flag, variation and segment
+    identifiers, attribute names and operators. Interned strings are never
+    freed, so values and target identifiers, which have no bound, are not
+    interned."""
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+def approximate_size(obj: Any) -> int:
+    """Approximate number of bytes used by an object and the objects it
+    references, counting shared objects once. Functions are followed into
+    their closures and bound methods into the object they are bound to, so
+    the constants folded into compiled predicates are counted. Classes and
+    modules are counted without following their references."""
+    seen: Set[int] = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, _OPAQUE_TYPES):
+            continue
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        elif isinstance(current, types.FunctionType):
+            for cell in current.__closure__ or ():
+                try:
+                    pending.append(cell.cell_contents)
+                except ValueError:
+                    # The variable is not assigned yet
+                    pass
+        elif isinstance(current, _BOUND_TYPES):
+            # Builtin functions are bound to their module, which is opaque
+            pending.append(current.__self__)
+        elif isinstance(current, functools.partial):
+            pending.append(current.func)
+            pending.extend(current.args)
+            pending.append(current.keywords)
+        else:
+            if hasattr(current, "__dict__"):
+                pending.append(vars(current))
+            for klass in type(current).__mro__:
+                for slot in getattr(klass, "__slots__", ()):
+                    if hasattr(current, slot):
+                        pending.append(getattr(current, slot))
+    return size
+
+
+_OPAQUE_TYPES = (type, types.ModuleType, str, bytes, int, float, bool)
+_BOUND_TYPES = (types.MethodType, types.BuiltinMethodType,
+                types.MethodWrapperType)
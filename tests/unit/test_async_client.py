@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import httpx
+import jwt
+
+from featureflags.async_client import AsyncCfClient
+from featureflags.config import (Config, with_analytics_enabled,
+                                 with_httpx_args, with_stream_enabled)
+from featureflags.evaluations.auth_target import Target
+from featureflags.openapi.config.models.feature_config import FeatureConfig
+
+FLAG = {
+    "feature": "bool-flag", "environment": "test", "project": "default",
+    "kind": "boolean", "state": "on", "offVariation": "false", "version": 1,
+    "defaultServe": {"variation": "true"},
+    "variations": [{"identifier": "true", "value": "true"},
+                   {"identifier": "false", "value": "false"}],
+}
+
+
+def handle(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/client/auth"):
+        token = jwt.encode({"environment": "env",
+                            "clusterIdentifier": "1"}, "secret" * 8)
+        return httpx.Response(200, json={"authToken": token})
+    if request.url.path.endswith("/feature-configs"):
+        return httpx.Response(200, json=[FLAG])
+    if request.url.path.endswith("/feature-configs/bool-flag"):
+        return httpx.Response(200, json=dict(FLAG, state="off", version=2))
+    if request.url.path.endswith("/stream"):
+        event = {"event": "patch", "domain": "flag",
+                 "identifier": "bool-flag", "version": 2}
+        return httpx.Response(200, text=f"data: {json.dumps(event)}\n\n")
+    if request.url.path.endswith("/target-segments"):
+        return httpx.Response(200, json=[])
+    return httpx.Response(404)
+
+
+def test_async_client_evaluates_flags_fetched_on_the_loop():
+    async def run():
+        async with AsyncCfClient(
+                "sdk-key", with_stream_enabled(False),
+                with_analytics_enabled(False),
+                with_httpx_args({"transport": httpx.MockTransport(handle)})
+        ) as client:
+            await client.wait_for_initialization(timeout=5)
+            assert client.is_initialized()
+            return client.bool_variation("bool-flag", Target("john"), False)
+
+    assert asyncio.run(run()) is True
+
+
+def test_async_client_evaluates_before_analytics_is_created():
+    async def run():
+        async with AsyncCfClient(
+                "sdk-key", with_stream_enabled(False),
+                with_analytics_enabled(True),
+                with_httpx_args({"transport": httpx.MockTransport(handle)}),
+                config=Config()
+        ) as client:
+            # The client task has not run yet
+            client._repository.set_flag(FeatureConfig.from_dict(FLAG))
+            return client.evaluate_all(Target("john"))
+
+    assert asyncio.run(run()) == {"bool-flag": True}
+
+
+def test_async_client_evaluates_after_failed_authentication():
+    async def run():
+        async with AsyncCfClient(
+                "sdk-key", with_stream_enabled(False),
+                with_analytics_enabled(True),
+                with_httpx_args({"transport": httpx.MockTransport(
+                    lambda request: httpx.Response(403))}),
+                config=Config()
+        ) as client:
+            await client.wait_for_initialization(timeout=5)
+            assert not client.is_initialized()
+            return client.evaluate_all(Target("john"))
+
+    assert asyncio.run(run()) == {}
+
+
+def test_async_client_fails_initialization_without_sdk_key():
+    async def run():
+        async with AsyncCfClient("") as client:
+            await client.wait_for_initialization(timeout=5)
+            return client.is_initialized()
+
+    assert asyncio.run(run()) is False
+
+
+def test_async_client_applies_stream_events():
+    async def run():
+        async with AsyncCfClient(
+                "sdk-key", with_stream_enabled(True),
+                with_analytics_enabled(False),
+                with_httpx_args({"transport": httpx.MockTransport(handle)})
+        ) as client:
+            await client.wait_for_initialization(timeout=5)
+            for _ in range(100):
+                if not client.bool_variation("bool-flag", Target("john"),
+                                             True):
+                    return True
+                await asyncio.sleep(0.01)
+            return False
+
+    assert asyncio.run(run()) is True
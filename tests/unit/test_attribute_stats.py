@@ -0,0 +1,34 @@
+from featureflags.evaluations.attribute_stats import MissingAttributes
+from featureflags.util import log
+
+
+def test_missing_attributes_counted_per_attribute_and_flag():
+    missing = MissingAttributes()
+
+    missing.record("email", "flag-a")
+    missing.record("email", "flag-b")
+    missing.record("age", "flag-a")
+    missing.record("age")
+
+    stats = missing.stats()
+    assert stats.attributes == {"email": 2, "age": 2}
+    assert stats.flags == {"flag-a": {"email": 1, "age": 1},
+                           "flag-b": {"email": 1}}
+
+    missing.reset()
+    assert missing.stats().attributes == {}
+
+
+def test_missing_attributes_summary_logged_once_per_interval(mocker):
+    now = [0.0]
+    missing = MissingAttributes(interval=60, clock=lambda: now[0])
+    warning = mocker.patch.object(log, "warning")
+
+    for _ in range(1000):
+        missing.record("email", "flag")
+    assert warning.call_count == 1
+
+    now[0] = 61.0
+    missing.record("age", "flag")
+    assert warning.call_count == 2
+    assert "email (999), age (1)" in warning.call_args.args[1]
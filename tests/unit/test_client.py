@@ -0,0 +1,29 @@
+import httpx
+
+from featureflags.client import CfClient
+from featureflags.config import Config, with_httpx_args
+from featureflags.evaluations.auth_target import Target
+from featureflags.lru_cache import LRUCache
+
+
+def forbidden(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(403)
+
+
+def test_evaluate_all_after_failed_authentication():
+    client = CfClient(
+        "sdk-key", with_httpx_args({"transport": httpx.MockTransport(
+            forbidden)}), config=Config())
+    target = Target("john")
+
+    assert not client.is_initialized()
+    assert client.evaluate_all(target) == {}
+    assert client.evaluate_many(["bool-flag"], target) == {}
+    assert client.bool_variation("bool-flag", target, True) is True
+
+
+def test_snapshot_repository_is_the_default_without_a_cache():
+    assert Config().snapshot_repository is True
+    assert Config(cache=LRUCache()).snapshot_repository is False
+    assert Config(cache=LRUCache(),
+                  snapshot_repository=True).snapshot_repository is True
@@ -0,0 +1,169 @@
+from featureflags.evaluations.auth_target import Target
+import pytest
+
+from featureflags.evaluations.compiled import (UNPARSABLE, compile_clause,
+                                               compile_flag, compile_segment,
+                                               parse_value)
+from featureflags.evaluations.constants import (EQUAL_OPERATOR,
+                                                SEGMENT_MATCH_OPERATOR)
+from featureflags.ftypes import String
+from featureflags.lru_cache import LRUCache
+from featureflags.openapi.config.models import FeatureState
+from featureflags.openapi.config.models.clause import Clause
+from featureflags.openapi.config.models.feature_config import (
+    FeatureConfig, FeatureConfigKind)
+from featureflags.openapi.config.models.segment import Segment
+from featureflags.openapi.config.models.serve import Serve
+from featureflags.openapi.config.models.target_map import TargetMap
+from featureflags.openapi.config.models.variation import Variation
+from featureflags.openapi.config.models.variation_map import VariationMap
+from featureflags.repository import Repository
+
+
+def make_feature(**kwargs):
+    return FeatureConfig(
+        feature="bool-flag",
+        environment="test",
+        default_serve=Serve(variation="true"),
+        kind=FeatureConfigKind.BOOLEAN,
+        off_variation="false",
+        project="default",
+        state=FeatureState.ON,
+        variations=[Variation(identifier="true", value="true"),
+                    Variation(identifier="false", value="false")],
+        **kwargs
+    )
+
+
+def test_compile_clause_resolves_operator():
+    clause = compile_clause(Clause(attribute="email", op="EQUAL",
+                                   values=["john@doe.com"], negate=False))
+
+    assert clause.op == EQUAL_OPERATOR
+    assert clause.predicate(String("John@Doe.com")) is True
+    assert clause.predicate(String("jane@doe.com")) is False
+
+
+def test_compile_clause_unknown_operator():
+    clause = compile_clause(Clause(attribute="email", op="unknown",
+                                   values=["john@doe.com"], negate=False))
+
+    assert clause.predicate is None
+
+
+def test_compile_clause_segment_match():
+    clause = compile_clause(Clause(attribute="", op=SEGMENT_MATCH_OPERATOR,
+                                   values=["beta"], negate=False))
+
+    assert clause.op == SEGMENT_MATCH_OPERATOR.lower()
+    assert clause.predicate is None
+
+
+def test_compile_flag():
+    flag = compile_flag(make_feature(
+        variation_to_target_map=[
+            VariationMap(variation="true", targets=[
+                TargetMap(identifier="john", name="John")])
+        ],
+        version=3
+    ))
+
+    assert flag.enabled is True
+    assert flag.version == 3
+    assert flag.default_serve.variation == "true"
+    assert flag.default_serve.distribution is None
+    assert flag.rules == ()
+    assert flag.prerequisites == ()
+    assert set(flag.variations) == {"true", "false"}
+    assert flag.target_variations == {"john": "true"}
+    assert flag.variation_to_target_map == ()
+
+
+def test_compile_segment_unset_lists():
+    segment = compile_segment(Segment(identifier="beta", name="Beta"))
+
+    assert segment.included == frozenset()
+    assert segment.excluded == frozenset()
+    assert segment.rules == ()
+    assert segment.serving_rules == ()
+    assert segment.version is None
+
+
+def test_repository_keeps_compiled_flag():
+    repository = Repository(LRUCache())
+    feature = make_feature()
+    repository.set_flag(feature)
+
+    assert repository.get_flag(feature.feature) == feature
+    assert repository.get_compiled_flag(feature.feature).config == feature
+
+
+def test_compile_segment_identifier_sets():
+    segment = compile_segment(Segment(
+        identifier="beta",
+        name="Beta",
+        included=[Target(identifier="john", name="John")],
+        excluded=[Target(identifier="jane", name="Jane")],
+    ))
+
+    assert segment.included == frozenset({"john"})
+    assert segment.excluded == frozenset({"jane"})
+
+
+def test_compile_segment_keeps_no_openapi_targets():
+    segment = compile_segment(Segment(
+        identifier="large",
+        name="large",
+        included=[Target(identifier=f"user-{i}", name=f"User {i}")
+                  for i in range(100)],
+    ))
+
+    assert not hasattr(segment, "__dict__")
+    assert isinstance(segment.source, bytes)
+    assert segment.included == {f"user-{i}" for i in range(100)}
+    assert len(segment.config.included) == 100
+
+
+def test_compile_flag_interns_identifiers():
+    first = make_feature()
+    second = make_feature()
+    second.variations = [Variation(identifier="".join(["tr", "ue"]),
+                                   value="true")]
+
+    assert compile_flag(first).variations["true"].identifier is \
+        compile_flag(second).variations["true"].identifier
+
+
+def test_compile_flag_keeps_variation_values():
+    # Values are unbounded and are not interned, see util.intern_str
+    value = "".join(["tr", "ue"])
+    fc = make_feature()
+    fc.variations = [Variation(identifier="true", value=value)]
+
+    assert compile_flag(fc).variations["true"].value is value
+
+
+@pytest.mark.parametrize('kind,value,expected', [
+    (FeatureConfigKind.BOOLEAN, "TRUE", True),
+    (FeatureConfigKind.BOOLEAN, "false", False),
+    (FeatureConfigKind.INT, "42", 42),
+    (FeatureConfigKind.INT, "4.2", 4.2),
+    (FeatureConfigKind.INT, "many", UNPARSABLE),
+    (FeatureConfigKind.STRING, "text", "text"),
+    (FeatureConfigKind.JSON, '{"a": [1]}', {"a": [1]}),
+    (FeatureConfigKind.JSON, '{"a"', UNPARSABLE),
+])
+def test_parse_value(kind, value, expected):
+    assert parse_value(kind, value) == expected
+
+
+def test_compile_flag_parses_variation_values():
+    flag = compile_flag(make_feature())
+
+    assert flag.variations["true"].parsed is True
+    assert flag.variations["false"].parsed is False
+    assert flag.variations["true"] == Variation(identifier="true",
+                                                value="true")
+    assert Variation(identifier="true", value="true") == \
+        flag.variations["true"]
+    assert flag.variations["true"] != flag.variations["false"]
@@ -1,10 +1,16 @@
 import pytest
 
 from featureflags.evaluations.auth_target import Target
+from featureflags.evaluations.compiled import (compile_clause,
+                                               compile_distribution,
+                                               compile_flag)
 from featureflags.evaluations.constants import (EQUAL_OPERATOR,
                                                 STARTS_WITH_OPERATOR)
 from featureflags.openapi.config.models import FeatureState
-from featureflags.evaluations.evaluator import Evaluator
+from featureflags.evaluations.context import EvaluationContext
+from featureflags.evaluations.evaluator import (Evaluator,
+                                                FlagKindMismatchException)
+from featureflags.evaluations.result_cache import ResultCache
 from featureflags.lru_cache import LRUCache
 from featureflags.openapi.config.models.clause import Clause
 from featureflags.openapi.config.models.distribution import Distribution
@@ -12,6 +18,7 @@ from featureflags.openapi.config.models.feature_config import (
     FeatureConfig, FeatureConfigKind)
 from featureflags.openapi.config.models.group_serving_rule import \
     GroupServingRule
+from featureflags.openapi.config.models.prerequisite import Prerequisite
 from featureflags.openapi.config.models.segment import Segment
 from featureflags.openapi.config.models.serve import Serve
 from featureflags.openapi.config.models.serving_rule import ServingRule
@@ -21,6 +28,7 @@ from featureflags.openapi.config.models.variation_map import VariationMap
 from featureflags.openapi.config.models.weighted_variation import \
     WeightedVariation
 from featureflags.repository import Repository
+from featureflags.util import log
 
 TRUE = "true"
 FALSE = "false"
@@ -110,7 +118,8 @@ def test_find_variation(request, data_provider, variations, identifier,
 
     expected = request.getfixturevalue(expected)
 
-    got = evaluator._find_variation(variations, identifier)
+    got = evaluator._find_variation(
+        {v.identifier: v for v in variations}, identifier)
 
     assert got == expected
 
@@ -128,22 +137,52 @@ def test_get_normalized_number(bucket_by, value, expected):
     assert got == expected
 
 
-def test_is_enabled(data_provider, target):
+def test_get_bucket(data_provider, target):
     evaluator = Evaluator(data_provider)
 
-    got = evaluator._is_enabled(target, "email", 10)
+    assert evaluator._get_bucket(target, "email") == 18
+    assert evaluator._get_bucket(target, "missing") == \
+        evaluator._get_normalized_number("identifier", "john")
+    assert evaluator._get_bucket(Target(identifier=""), "email") is None
 
-    assert got is False
+
+def test_evaluate_distribution_outside_bucket(data_provider, target):
+    evaluator = Evaluator(data_provider)
+    distribution = compile_distribution(Distribution("email", [
+        WeightedVariation("a", 10),
+        WeightedVariation("b", 0),
+    ]))
+
+    assert evaluator._evaluate_distribution(distribution, target) == "b"
 
 
 def test_evaluate_distribution(data_provider, distribution_by_email, target):
     evaluator = Evaluator(data_provider)
 
-    got = evaluator._evaluate_distribution(distribution_by_email, target)
+    got = evaluator._evaluate_distribution(
+        compile_distribution(distribution_by_email), target)
 
     assert got == 'true'
 
 
+def test_evaluate_distribution_buckets_once(data_provider, target, mocker):
+    evaluator = Evaluator(data_provider)
+    context = EvaluationContext()
+    spy = mocker.spy(evaluator, "_get_normalized_number")
+    distribution = compile_distribution(Distribution("email", [
+        WeightedVariation("a", 10),
+        WeightedVariation("b", 10),
+        WeightedVariation("c", 80),
+    ]))
+
+    first = evaluator._evaluate_distribution(distribution, target, context)
+    second = evaluator._evaluate_distribution(distribution, target, context)
+
+    assert first == second == "b"
+    assert spy.call_count == 1
+    assert context.buckets == {("email", "john@doe.com"): 18}
+
+
 def test_check_target_in_segment(data_provider, target):
     evaluator = Evaluator(data_provider)
 
@@ -163,7 +202,7 @@ def test_evaluate_clause(data_provider, target):
         negate=FALSE
     )
 
-    got = evaluator._evaluate_clause(clause, target)
+    got = evaluator._evaluate_clause(compile_clause(clause), target)
 
     assert got is True
 
@@ -214,11 +253,12 @@ def test_evaluate_clauses(data_provider, target):
     ]
 
     for tc in testcases:
-        actual = evaluator._evaluate_clauses(tc["input"], target)
+        clauses = [compile_clause(clause) for clause in tc["input"]]
+        actual = evaluator._evaluate_clauses(clauses, target)
         assert actual is tc["expected"]
 
 
-def test_evaluate_rules(data_provider, target):
+def test_evaluate_rules(data_provider, feature, target):
     evaluator = Evaluator(data_provider)
 
     clause = Clause(
@@ -240,12 +280,13 @@ def test_evaluate_rules(data_provider, target):
         )
     ]
 
-    got = evaluator._evaluate_rules(rules, target)
+    feature.rules = rules
+    got = evaluator._evaluate_rules(compile_flag(feature).rules, target)
 
     assert got == TRUE
 
 
-def test_evaluate_variation_map(data_provider, target):
+def test_evaluate_variation_map(data_provider, feature, target):
     evaluator = Evaluator(data_provider)
 
     vmap = [
@@ -253,19 +294,21 @@ def test_evaluate_variation_map(data_provider, target):
             name=target.name, identifier=target.identifier)])
     ]
 
-    got = evaluator._evaluate_variation_map(vmap, target)
+    feature.variation_to_target_map = vmap
+    got = evaluator._evaluate_variation_map(compile_flag(feature), target)
 
     assert got == TRUE
 
 
-def test_evaluate_variation_segments_map(data_provider, target):
+def test_evaluate_variation_segments_map(data_provider, feature, target):
     evaluator = Evaluator(data_provider)
 
     vmap = [
         VariationMap(variation=TRUE, target_segments=["beta"])
     ]
 
-    got = evaluator._evaluate_variation_map(vmap, target)
+    feature.variation_to_target_map = vmap
+    got = evaluator._evaluate_variation_map(compile_flag(feature), target)
 
     assert got == TRUE
 
@@ -273,7 +316,7 @@ def test_evaluate_variation_segments_map(data_provider, target):
 def test_evaluate_flag_off(data_provider, feature, target, false_variation):
     evaluator = Evaluator(data_provider)
     feature.state = FeatureState.OFF
-    got = evaluator._evaluate_flag(feature, target)
+    got = evaluator._evaluate_flag(compile_flag(feature), target)
 
     assert got == false_variation
 
@@ -281,7 +324,7 @@ def test_evaluate_flag_off(data_provider, feature, target, false_variation):
 def test_evaluate_flag_on(data_provider, feature, target, true_variation):
     evaluator = Evaluator(data_provider)
 
-    got = evaluator._evaluate_flag(feature, target)
+    got = evaluator._evaluate_flag(compile_flag(feature), target)
 
     assert got == true_variation
 
@@ -406,3 +449,226 @@ def test_enhanced_v2_rules(flag_name, email, role, expected):
     got = evaluator.evaluate(flag_name, target, "boolean")
 
     assert got.value.lower() == str(expected).lower()
+
+
+def test_evaluate_rules_by_priority(data_provider, feature, target):
+    def rule(priority, variation):
+        return ServingRule(
+            clauses=[Clause(attribute="identifier", op=EQUAL_OPERATOR,
+                            values=[target.identifier], negate=False)],
+            priority=priority,
+            rule_id=str(priority),
+            serve=Serve(variation=variation)
+        )
+
+    feature.rules = [rule(2, TRUE), rule(1, FALSE)]
+    data_provider.set_flag(feature)
+    evaluator = Evaluator(data_provider)
+
+    got = evaluator.evaluate(feature.feature, target, "boolean")
+
+    assert got.identifier == FALSE
+    assert [r.priority for r in data_provider.get_compiled_flag(
+        feature.feature).rules] == [1, 2]
+
+
+def test_evaluate_variation_map_targets_before_segments(data_provider,
+                                                        feature, target):
+    evaluator = Evaluator(data_provider)
+
+    feature.variation_to_target_map = [
+        VariationMap(variation=FALSE, target_segments=["beta"]),
+        VariationMap(variation=TRUE, targets=[TargetMap(
+            name=target.name, identifier=target.identifier)]),
+    ]
+    flag = compile_flag(feature)
+
+    assert flag.target_variations == {target.identifier: TRUE}
+    assert evaluator._evaluate_variation_map(flag, target) == TRUE
+
+
+def test_result_cache_invalidated_by_segment_update(data_provider, feature,
+                                                    segment, target):
+    evaluator = Evaluator(data_provider, ResultCache())
+    feature.variation_to_target_map = [
+        VariationMap(variation=FALSE, target_segments=[segment.identifier])
+    ]
+    data_provider.set_flag(feature)
+
+    assert evaluator.evaluate(feature.feature, target,
+                              "boolean").identifier == FALSE
+    assert len(evaluator.result_cache) == 1
+
+    data_provider.set_segment(Segment(
+        identifier=segment.identifier,
+        name=segment.name,
+        environment="test",
+        version=segment.version + 1
+    ))
+
+    assert evaluator.evaluate(feature.feature, target,
+                              "boolean").identifier == TRUE
+    assert len(evaluator.result_cache) == 2
+
+
+def test_segment_membership_memoized_per_context(data_provider, segment,
+                                                 target, mocker):
+    evaluator = Evaluator(data_provider)
+    context = EvaluationContext()
+    spy = mocker.spy(evaluator, "_segment_membership")
+
+    assert evaluator._check_target_in_segment([segment.identifier], target,
+                                              context) is True
+    assert evaluator._check_target_in_segment([segment.identifier], target,
+                                              context) is True
+    assert spy.call_count == 1
+
+    data_provider.set_segment(Segment(
+        identifier=segment.identifier,
+        name=segment.name,
+        environment="test",
+        version=segment.version + 1
+    ))
+
+    assert evaluator._check_target_in_segment([segment.identifier], target,
+                                              context) is False
+    assert spy.call_count == 2
+
+
+def test_attribute_types_resolved_once_per_context(data_provider, target,
+                                                   mocker):
+    evaluator = Evaluator(data_provider)
+    context = EvaluationContext()
+    spy = mocker.spy(target, "get_type")
+    clauses = [
+        compile_clause(Clause(attribute="email", op=STARTS_WITH_OPERATOR,
+                              values=["jane"], negate=False)),
+        compile_clause(Clause(attribute="email", op=EQUAL_OPERATOR,
+                              values=["John@Doe.com"], negate=False)),
+    ]
+
+    assert evaluator._evaluate_clauses_v2(clauses, target, context) is False
+    assert evaluator._evaluate_clauses(clauses, target, context) is True
+    assert spy.call_count == 1
+
+
+def test_evaluate_many(data_provider, feature, target):
+    evaluator = Evaluator(data_provider)
+
+    got = evaluator.evaluate_many([feature.feature, "unknown"], target)
+
+    assert list(got) == [feature.feature]
+    kind, variation = got[feature.feature]
+    assert kind == FeatureConfigKind.BOOLEAN
+    assert variation == evaluator.evaluate(feature.feature, target, kind)
+
+
+def test_evaluate_all(data_provider, feature, target):
+    evaluator = Evaluator(data_provider)
+    other = FeatureConfig.from_dict(feature.to_dict())
+    other.feature = "other-flag"
+    other.state = FeatureState.OFF
+    data_provider.set_flag(other)
+
+    got = evaluator.evaluate_all(target)
+
+    assert data_provider.get_flag_identifiers() == [feature.feature,
+                                                    other.feature]
+    assert got[feature.feature][1].identifier == TRUE
+    assert got[other.feature][1].identifier == FALSE
+
+
+def test_evaluate_targets(data_provider, feature, segment, mocker):
+    evaluator = Evaluator(data_provider)
+    feature.variation_to_target_map = [
+        VariationMap(variation=FALSE, target_segments=[segment.identifier])
+    ]
+    data_provider.set_flag(feature)
+    spy = mocker.spy(data_provider, "get_compiled_segment")
+    targets = [Target(identifier=identifier)
+               for identifier in ("john", "jane", "bob")]
+
+    got = evaluator.evaluate_targets(feature.feature, targets, "boolean")
+
+    assert [(t.identifier, v.identifier) for t, v in got] == [
+        ("john", FALSE), ("jane", TRUE), ("bob", TRUE)]
+    assert spy.call_count == 1
+
+
+def test_evaluate_targets_kind_mismatch(data_provider, feature):
+    evaluator = Evaluator(data_provider)
+
+    with pytest.raises(FlagKindMismatchException):
+        evaluator.evaluate_targets(feature.feature, [], "string")
+
+
+def set_prerequisite_flags(repository, feature, graph):
+    for identifier, prerequisites in graph.items():
+        flag = FeatureConfig.from_dict(feature.to_dict())
+        flag.feature = identifier
+        flag.prerequisites = [Prerequisite(feature=p, variations=[TRUE])
+                              for p in prerequisites]
+        repository.set_flag(flag)
+
+
+def test_prerequisites_evaluated_once(data_provider, feature, target,
+                                      mocker):
+    evaluator = Evaluator(data_provider)
+    set_prerequisite_flags(data_provider, feature, {
+        "d": [], "b": ["d"], "c": ["d"], "a": ["b", "c"]})
+    spy = mocker.spy(evaluator, "_evaluate_flag")
+
+    got = evaluator.evaluate("a", target, "boolean")
+
+    assert got.identifier == TRUE
+    assert sorted(call.args[0].feature for call in spy.call_args_list) == \
+        ["a", "b", "c", "d"]
+
+
+def test_prerequisite_cycle(data_provider, feature, target):
+    evaluator = Evaluator(data_provider)
+    set_prerequisite_flags(data_provider, feature, {
+        "a": ["b"], "b": ["c"], "c": ["a"]})
+
+    assert evaluator.evaluate("a", target, "boolean").identifier == FALSE
+
+
+def test_evaluation_traced_for_chosen_targets(data_provider, feature, target):
+    traces = []
+    evaluator = Evaluator(data_provider, ResultCache(),
+                          trace_targets=[target.identifier],
+                          trace_handler=traces.append)
+
+    evaluator.evaluate(feature.feature, target, "boolean")
+    evaluator.evaluate(feature.feature, Target(identifier="jane"), "boolean")
+
+    assert len(traces) == 1
+    assert traces[0].target == target.identifier
+    assert "feature bool-flag enabled is True" in traces[0].messages()
+
+    evaluator.set_trace_targets([])
+    evaluator.evaluate(feature.feature, target, "boolean")
+
+    assert len(traces) == 1
+
+
+def test_context_not_tracing_by_default():
+    assert EvaluationContext().tracing is False
+
+
+def test_missing_attributes_counted_not_logged(data_provider, target, mocker):
+    evaluator = Evaluator(data_provider)
+    clause = Clause(attribute="country", op=EQUAL_OPERATOR, values=["UK"],
+                    negate=False)
+    context = EvaluationContext()
+    context.flag = "bool-flag"
+    warning = mocker.spy(log, "warning")
+
+    for _ in range(3):
+        assert not evaluator._evaluate_clause(compile_clause(clause),
+                                              target, context)
+
+    assert warning.call_count == 1
+    stats = evaluator.missing_attributes.stats()
+    assert stats.attributes == {"country": 3}
+    assert stats.flags == {"bool-flag": {"country": 3}}
@@ -0,0 +1,40 @@
+import copy
+import json
+
+import pytest
+
+from featureflags.evaluations.json_values import freeze, view
+
+VALUE = '{"a": {"b": [1, {"c": 2}]}, "d": "text"}'
+
+
+def test_freeze_is_read_only():
+    frozen = freeze(json.loads(VALUE))
+
+    assert frozen == json.loads(VALUE)
+    with pytest.raises(TypeError):
+        frozen["d"] = "other"
+    with pytest.raises(TypeError):
+        frozen["a"]["b"].append(3)
+
+    modifiable = copy.deepcopy(frozen)
+    modifiable["a"]["b"].append(3)
+    assert frozen == json.loads(VALUE)
+
+
+def test_view_copies_on_write():
+    frozen = freeze(json.loads(VALUE))
+    got = view(frozen)
+
+    got["a"]["b"][1]["c"] = 3
+    got["a"]["b"].append(4)
+    got.pop("d")
+
+    assert got == {"a": {"b": [1, {"c": 3}, 4]}}
+    assert json.loads(json.dumps(got)) == got
+    assert frozen == json.loads(VALUE)
+    assert view(frozen) == json.loads(VALUE)
+
+
+def test_view_of_scalar():
+    assert view(freeze(json.loads("1"))) == 1
@@ -104,3 +104,29 @@ def test_cache_miss_doesnt_eject():
     assert len(cache) == 2
     assert "one" in cache.keys()
     assert "two" in cache.keys()
+
+
+def test_cache_get_miss_returns_default():
+    cache = LRUCache([("one", 1)], size=2)
+    missing = object()
+
+    assert cache.get("foo") is None
+    assert cache.get("foo", missing) is missing
+    assert len(cache) == 1
+
+
+def test_cache_get_does_not_reorder():
+    cache = LRUCache([("one", 1), ("two", 2)], size=2)
+
+    assert cache.get("two") == 2
+    assert cache.get("one") == 1
+    assert cache.keys() == ["one", "two"]
+
+
+def test_cache_contains_none_value():
+    cache = LRUCache()
+    cache["none"] = None
+
+    assert "none" in cache
+    assert cache["none"] is None
+    assert "foo" not in cache
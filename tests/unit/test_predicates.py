@@ -0,0 +1,89 @@
+import operator
+import sys
+
+import pytest
+
+from featureflags.evaluations.predicates import (MATCH_MAX_INPUT_LENGTH,
+                                                 compile_predicate)
+from featureflags.ftypes import JSON, Boolean, Integer, Number, String
+from featureflags.util import approximate_size
+
+OPERANDS = [String("John@Doe.com"), String("10"), String("b"), Integer(10),
+            Integer(-3), Number(3.5), Number(10.0), Boolean(True),
+            Boolean(False), JSON({"a": 1})]
+
+VALUES = [["john@doe.com"], ["John"], [".com"], ["10"], ["3.5"], ["a", "b"],
+          [10, 3.5], ["true"], ["false"], [""]]
+
+
+def call(predicate, operand):
+    try:
+        return predicate(operand)
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize("method", ["equal", "equal_sensitive",
+                                    "greater_than", "starts_with",
+                                    "ends_with", "contains", "in_list"])
+def test_compile_predicate_matches_ftypes(method):
+    for values in VALUES:
+        predicate = compile_predicate(method, values)
+        expected = operator.methodcaller(method, values)
+        for operand in OPERANDS:
+            assert call(predicate, operand) == call(expected, operand), \
+                (method, values, operand)
+
+
+def test_compile_predicate_unhashable_values():
+    predicate = compile_predicate("in_list", [["a"], "b"])
+
+    assert predicate(String("b")) is True
+    assert predicate(String("a")) is False
+
+
+def test_compile_predicate_match():
+    predicate = compile_predicate("match", ["^john@.*\\.com$"])
+
+    assert predicate(String("john@doe.com")) is True
+    assert predicate(String("jane@doe.com")) is False
+    assert predicate(String("xjohn@doe.com")) is False
+    assert predicate(Integer(10)) is False
+
+
+@pytest.mark.parametrize("pattern", ["(", "(a+)+$", "(\\w*)*x",
+                                     "([a-z]+)*$", "(?:.*)+!"])
+def test_compile_predicate_match_rejected_patterns(pattern):
+    predicate = compile_predicate("match", [pattern])
+
+    assert predicate(String("a" * 30)) is False
+
+
+@pytest.mark.parametrize("pattern, value", [
+    ("^(\\d{3})+$", "123456"),
+    ("^(ab+)+$", "abbab"),
+    ("^([a-z]+\\.)+com$", "mail.example.com"),
+    ("^(\\w+)@example\\.com$", "john@example.com"),
+    ("^(a|b)+$", "abba"),
+])
+def test_compile_predicate_match_accepts_unambiguous_groups(pattern, value):
+    predicate = compile_predicate("match", [pattern])
+
+    assert predicate(String(value)) is True
+
+
+def test_compile_predicate_match_long_input():
+    predicate = compile_predicate("match", ["a"])
+
+    assert predicate(String("a" * MATCH_MAX_INPUT_LENGTH)) is True
+    assert predicate(String("a" * (MATCH_MAX_INPUT_LENGTH + 1))) is False
+
+
+def test_approximate_size_counts_folded_constants():
+    values = [f"user-{i}" for i in range(1000)]
+
+    few = approximate_size(compile_predicate("in_list", values[:1]))
+    many = approximate_size(compile_predicate("in_list", values))
+
+    assert many - few >= sys.getsizeof(frozenset(values)) + \
+        sum(sys.getsizeof(value) for value in values[1:])
@@ -0,0 +1,285 @@
+import pytest
+
+from featureflags import repository as repository_module
+from featureflags import snapshot_repository
+from featureflags.evaluations.constants import SEGMENT_MATCH_OPERATOR
+from featureflags.interface import Store
+from featureflags.lru_cache import LRUCache
+from featureflags.openapi.config.models import FeatureState
+from featureflags.openapi.config.models.clause import Clause
+from featureflags.openapi.config.models.feature_config import (
+    FeatureConfig, FeatureConfigKind)
+from featureflags.openapi.config.models.prerequisite import Prerequisite
+from featureflags.openapi.config.models.segment import Segment
+from featureflags.openapi.config.models.serve import Serve
+from featureflags.openapi.config.models.serving_rule import ServingRule
+from featureflags.openapi.config.models.variation import Variation
+from featureflags.repository import Repository
+from featureflags.snapshot_repository import SnapshotRepository
+
+
+def make_flag(identifier, segments=(), prerequisites=()):
+    rules = [
+        ServingRule(
+            rule_id="rule", priority=0, serve=Serve(variation="true"),
+            clauses=[Clause(attribute="", op=SEGMENT_MATCH_OPERATOR,
+                            values=list(segments), negate=False)])
+    ] if segments else []
+    return FeatureConfig(
+        feature=identifier,
+        environment="test",
+        default_serve=Serve(variation="true"),
+        kind=FeatureConfigKind.BOOLEAN,
+        off_variation="false",
+        project="default",
+        state=FeatureState.ON,
+        variations=[Variation(identifier="true", value="true"),
+                    Variation(identifier="false", value="false")],
+        rules=rules,
+        prerequisites=[Prerequisite(feature=p, variations=["true"])
+                       for p in prerequisites],
+    )
+
+
+def make_segment(identifier, segments=()):
+    return Segment(identifier=identifier, name=identifier,
+                   rules=[Clause(attribute="", op=SEGMENT_MATCH_OPERATOR,
+                                 values=[s], negate=False)
+                          for s in segments])
+
+
+@pytest.fixture(params=["lru", "snapshot"])
+def repository(request):
+    if request.param == "snapshot":
+        repository = SnapshotRepository()
+    else:
+        repository = Repository(LRUCache())
+    repository.set_segment(make_segment("inner"))
+    repository.set_segment(make_segment("outer", segments=["inner"]))
+    repository.set_flag(make_flag("by-outer", segments=["outer"]))
+    repository.set_flag(make_flag("by-inner", segments=["inner"]))
+    repository.set_flag(make_flag("dependent", prerequisites=["by-outer"]))
+    repository.set_flag(make_flag("unrelated"))
+    return repository
+
+
+def generations(repository):
+    return {identifier: repository.get_flag_generation(identifier)
+            for identifier in repository.get_flag_identifiers()}
+
+
+def test_find_flags_by_segment(repository):
+    assert repository.find_flags_by_segment("outer") == ["by-outer"]
+    assert repository.find_flags_by_segment("inner") == ["by-inner"]
+    assert repository.find_flags_by_segment("missing") == []
+
+
+def test_find_flags_by_segment_after_update(repository):
+    repository.set_flag(make_flag("by-outer", segments=["inner"]))
+
+    assert repository.find_flags_by_segment("outer") == []
+    assert repository.find_flags_by_segment("inner") == ["by-inner",
+                                                         "by-outer"]
+
+    repository.remove_flag("by-inner")
+
+    assert repository.find_flags_by_segment("inner") == ["by-outer"]
+
+
+def test_segment_update_moves_dependent_generations(repository):
+    before = generations(repository)
+
+    repository.set_segment(make_segment("inner"))
+
+    after = generations(repository)
+    changed = {f for f in before if before[f] != after[f]}
+    assert changed == {"by-outer", "by-inner", "dependent"}
+
+
+def test_flag_update_moves_dependent_generations(repository):
+    before = generations(repository)
+
+    repository.remove_flag("by-outer")
+
+    after = generations(repository)
+    assert before["dependent"] != after["dependent"]
+    assert before["by-inner"] == after["by-inner"]
+    assert before["unrelated"] == after["unrelated"]
+
+
+def test_snapshot_pins_looked_up_objects(repository):
+    snapshot = repository.snapshot()
+    flag = snapshot.get_compiled_flag("by-outer")
+    segment = snapshot.get_compiled_segment("outer")
+    generation = snapshot.get_flag_generation("by-outer")
+
+    repository.set_flag(make_flag("by-outer", segments=["inner"]))
+    repository.set_segment(make_segment("outer"))
+
+    assert snapshot.get_compiled_flag("by-outer") is flag
+    assert snapshot.get_compiled_segment("outer") is segment
+    assert snapshot.get_flag_generation("by-outer") == generation
+    assert repository.get_compiled_flag("by-outer") is not flag
+
+
+def test_snapshot_is_not_affected_by_updates():
+    repository = SnapshotRepository()
+    repository.set_segment(make_segment("inner"))
+    repository.set_flag(make_flag("by-inner", segments=["inner"]))
+    snapshot = repository.snapshot()
+    generation = snapshot.get_flag_generation("by-inner")
+
+    repository.set_flag(make_flag("by-inner"))
+    repository.set_flag(make_flag("added"))
+    repository.remove_segment("inner")
+
+    assert snapshot.get_flag("by-inner").rules[0].clauses[0].values == \
+        ["inner"]
+    assert snapshot.get_flag("added") is None
+    assert snapshot.get_segment("inner") is not None
+    assert snapshot.get_flag_generation("by-inner") == generation
+    assert snapshot.find_flags_by_segment("inner") == ["by-inner"]
+
+    current = repository.snapshot()
+    assert current.get_flag("added") is not None
+    assert current.get_segment("inner") is None
+    assert current.get_flag_generation("by-inner") != generation
+    assert current.find_flags_by_segment("inner") == []
+
+
+def test_snapshot_repository_skips_outdated_flag():
+    repository = SnapshotRepository()
+    flag = make_flag("versioned")
+    flag.version = 2
+    repository.set_flag(flag)
+    outdated = make_flag("versioned", segments=["inner"])
+    outdated.version = 1
+
+    repository.set_flag(outdated)
+
+    assert repository.get_flag("versioned").rules == []
+
+
+def test_set_flag_does_not_reorder_the_stored_model(repository):
+    flag = make_flag("ordered")
+    flag.rules = [ServingRule(rule_id=str(priority), priority=priority,
+                              serve=Serve(variation="true"), clauses=[])
+                  for priority in (2, 1)]
+
+    repository.set_flag(flag)
+
+    assert [rule.priority for rule in flag.rules] == [2, 1]
+    assert [rule.priority for rule in repository.get_compiled_flag(
+        "ordered").rules] == [1, 2]
+
+
+def test_update_sets_flags_and_segments(repository):
+    repository.update(flags=[make_flag("by-added", segments=["added"])],
+                      segments=[make_segment("added")])
+
+    assert repository.get_compiled_segment("added") is not None
+    assert repository.find_flags_by_segment("added") == ["by-added"]
+
+
+def test_snapshot_repository_publishes_one_snapshot_per_update(mocker):
+    repository = SnapshotRepository()
+    flags = [make_flag(str(i)) for i in range(3)]
+    for flag in flags:
+        flag.version = 1
+    repository.update(flags=flags, segments=[make_segment("inner")])
+    snapshot = repository.snapshot()
+    compile_flag = mocker.spy(snapshot_repository, "compile_flag")
+
+    # A poll returning the same versions neither compiles nor publishes
+    repository.update(flags=flags)
+
+    assert repository.snapshot() is snapshot
+    assert compile_flag.call_count == 0
+    assert sorted(snapshot.get_flag_identifiers()) == ["0", "1", "2"]
+
+
+class RaisingCache(LRUCache):
+    def get(self, key, default=None):
+        value = super().get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+def test_repository_treats_key_error_as_a_miss():
+    repository = Repository(RaisingCache())
+    repository.set_flag(make_flag("cached"))
+
+    assert repository.get_compiled_flag("cached") is not None
+    assert repository.get_compiled_flag("missing") is None
+    assert repository.get_compiled_segment("missing") is None
+
+
+class DictStore(Store):
+    def __init__(self):
+        self.models = {}
+
+    def get(self, key):
+        return self.models.get(key)
+
+    def set(self, key, value):
+        self.models[key] = value
+
+    def remove(self, keys):
+        for key in keys:
+            self.models.pop(key, None)
+
+    def keys(self):
+        return list(self.models)
+
+    def close(self):
+        pass
+
+
+def test_repository_caches_plans_read_from_the_store():
+    repository = Repository(LRUCache(), DictStore())
+    flag = make_flag("stored")
+    repository.set_flag(flag)
+
+    compiled = repository.get_compiled_flag("stored")
+
+    assert repository.get_compiled_flag("stored") is compiled
+    assert compiled.config == flag
+    assert compiled.config is not flag
+
+    repository.set_flag(make_flag("stored", segments=["inner"]))
+
+    assert repository.get_compiled_flag("stored") is not compiled
+    assert repository.get_compiled_flag("stored").segments == {"inner"}
+
+
+def test_snapshot_copies_the_repository_when_taken(repository):
+    snapshot = repository.snapshot()
+    outer = repository.get_compiled_segment("outer")
+
+    repository.set_segment(make_segment("outer"))
+    repository.remove_flag("unrelated")
+
+    # Neither was read through the snapshot before the update
+    assert snapshot.get_compiled_segment("outer") is outer
+    assert snapshot.get_compiled_flag("unrelated") is not None
+    assert repository.snapshot().get_compiled_flag("unrelated") is None
+
+
+def test_repository_checks_stored_versions_without_compiling(mocker):
+    repository = Repository(LRUCache(), DictStore())
+    flag = make_flag("stored")
+    flag.version = 2
+    repository.set_flag(flag)
+    compile_flag = mocker.spy(repository_module, "compile_flag")
+
+    outdated = make_flag("stored", segments=["inner"])
+    outdated.version = 1
+    repository.set_flag(outdated)
+    assert compile_flag.call_count == 0
+
+    newer = make_flag("stored", segments=["inner"])
+    newer.version = 3
+    repository.set_flag(newer)
+    assert compile_flag.call_count == 1
+    assert repository.get_compiled_flag("stored").version == 3
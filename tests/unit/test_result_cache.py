@@ -0,0 +1,38 @@
+from featureflags.evaluations.result_cache import ResultCache
+from featureflags.openapi.config.models.variation import Variation
+
+TRUE = Variation(identifier="true", value="true")
+
+
+def test_result_cache_miss():
+    cache = ResultCache()
+
+    assert cache.get("missing") is None
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(size=2)
+    cache.set("one", TRUE)
+    cache.set("two", TRUE)
+    cache.get("one")
+    cache.set("three", TRUE)
+
+    assert len(cache) == 2
+    assert cache.get("one") is TRUE
+    assert cache.get("two") is None
+    assert cache.get("three") is TRUE
+
+
+def test_result_cache_ttl(mocker):
+    monotonic = mocker.patch(
+        "featureflags.evaluations.result_cache.time.monotonic",
+        return_value=100.0)
+    cache = ResultCache(ttl=10)
+    cache.set("one", TRUE)
+
+    monotonic.return_value = 105.0
+    assert cache.get("one") is TRUE
+
+    monotonic.return_value = 111.0
+    assert cache.get("one") is None
+    assert len(cache) == 0
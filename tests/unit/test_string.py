@@ -8,7 +8,8 @@ from featureflags.ftypes.string import String
     [
         ("harness.io", ["harness"], "harness", "starts_with", True),
         ("ci/cd harness", ["harness"], "harness", "ends_with", True),
-        ("^harness", ["harness"], "harness", "match", True),
+        ("harness.io", ["^harness"], "^harness", "match", True),
+        ("ci/cd harness", ["^harness"], "^harness", "match", False),
         ("ci/cd harness software", ["harness"], "harness", "contains", True),
         ("harness", ["harness"], "harness", "equal_sensitive", True),
         ("harness", ["harneSS"], "harneSS", "equal_sensitive", False),
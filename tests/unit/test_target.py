@@ -64,3 +64,13 @@ def test_get_type(target, attribute, expected):
     got = target.get_type(attribute)
 
     assert got.__class__ == expected
+
+
+def test_target_keeps_attributes_dict():
+    attributes = {"email": "a@b.c"}
+    target = Target(identifier="harness", attributes=attributes)
+
+    attributes["email"] = "d@e.f"
+
+    assert target.attributes is attributes
+    assert target.get_attr_value("email") == "d@e.f"
@@ -0,0 +1,41 @@
+from featureflags.config import Config
+from featureflags.unbounded_cache import UnboundedCache
+
+
+def test_cache_never_evicts():
+    cache = UnboundedCache()
+    for i in range(10000):
+        cache.set(f"flags/{i}", i)
+
+    assert len(cache) == 10000
+    assert cache.get("flags/0") == 0
+
+
+def test_cache_get_miss():
+    cache = UnboundedCache()
+    missing = object()
+
+    assert cache.get("foo") is None
+    assert cache.get("foo", missing) is missing
+
+
+def test_cache_remove():
+    cache = UnboundedCache()
+    cache.set("one", 1)
+    cache.set("two", 2)
+
+    cache.remove(["one", "three"])
+
+    assert cache.keys() == ["two"]
+
+
+def test_cache_memory_usage_grows():
+    cache = UnboundedCache()
+    empty = cache.memory_usage()
+    cache.set("flag", {"rules": ["a" * 1000]})
+
+    assert cache.memory_usage() > empty + 1000
+
+
+def test_config_default_cache_is_unbounded():
+    assert isinstance(Config().cache, UnboundedCache)